@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import time
+import importlib
 
 st.set_page_config(
     page_title="Healthcare Operations Intelligence Dashboard",
@@ -20,7 +21,7 @@ for key, val in {
     if key not in st.session_state:
         st.session_state[key] = val
 
-from myPages import page1, page2, page3, page4, page5, page6
+from myPages.data import load_tables
 
 PAGE_NAMES = [
     "Executive Overview",
@@ -234,7 +235,8 @@ if st.session_state.auto_refresh:
     elapsed = time.time() - st.session_state.last_refresh
     if elapsed >= st.session_state.refresh_interval:
         st.session_state.last_refresh = time.time()
-        st.cache_data.clear()
+        # cached sheets are keyed by content version — the rerun reloads only
+        # sheets that changed on disk, nothing if the workbook is untouched
         st.rerun()
 
 # ── Sidebar ────────────────────────────────────────────────────────────────────
@@ -294,17 +296,10 @@ with st.sidebar:
     st.markdown("<div class='sb-div'></div>", unsafe_allow_html=True)
     st.markdown("<div class='sb-hdr'>Global Filters</div>", unsafe_allow_html=True)
 
-    @st.cache_data(show_spinner=False)
-    def _load_filter_meta():
-        xls  = pd.ExcelFile("data/dataFinal.xlsx")
-        dept = pd.read_excel(xls, "Department")
-        appt = pd.read_excel(xls, "Appointment",
-                             usecols=["appointment_Date", "appointment_status"])
-        appt["appointment_Date"] = pd.to_datetime(appt["appointment_Date"], errors="coerce")
-        return dept, appt
-
     try:
-        dept_df, appt_df = _load_filter_meta()
+        dept_df, appt_df = load_tables("Department", "Appointment",
+                                       columns={"Department":  ("dept_Name",),
+                                                "Appointment": ("appointment_Date", "appointment_status")})
         min_d = appt_df["appointment_Date"].min()
         max_d = appt_df["appointment_Date"].max()
         st.date_input("Date Range", value=(min_d, max_d),
@@ -368,11 +363,13 @@ with st.sidebar:
         st.warning("Dataset file not found.")
 
 # ── Route to active page ───────────────────────────────────────────────────────
-{
-    "Executive Overview":                     page1,
-    "Patient Demographics & Demand Analysis": page2,
-    "Clinical & Disease Intelligence":        page3,
-    "Operational Efficiency & Capacity":      page4,
-    "Staffing & Resource Optimization":       page5,
-    "Intelligence & Planning":                page6,
-}[active_page].run()
\ No newline at end of file
+# A page module is imported the first time it is opened (then cached in
+# sys.modules), so startup only pays for the page being shown.
+importlib.import_module({
+    "Executive Overview":                     "myPages.page1",
+    "Patient Demographics & Demand Analysis": "myPages.page2",
+    "Clinical & Disease Intelligence":        "myPages.page3",
+    "Operational Efficiency & Capacity":      "myPages.page4",
+    "Staffing & Resource Optimization":       "myPages.page5",
+    "Intelligence & Planning":                "myPages.page6",
+}[active_page]).run()
\ No newline at end of file
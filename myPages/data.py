@@ -0,0 +1,785 @@
+import os
+import json
+import hashlib
+import time
+import threading
+import functools
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+EXCEL_PATH      = "data/dataFinal.xlsx"
+SNAPSHOT_DIR    = "data/.snapshot"
+SNAPSHOT_FORMAT = 5
+INCOMING_DIR    = "data/incoming"
+APPEND_SHEETS   = ("Appointment", "BedRecords")
+
+# Declared column types per sheet, applied when the snapshot is written and again
+# at load (a no-op for snapshot data). The keys are also the canonical column
+# names: a header that differs only in case or surrounding whitespace is renamed
+# to the spelling below, so every page reads the same names. "id" → narrowest integer that fits the
+# values (nullable Int* when the column has blanks), "category" → pandas
+# Categorical, "date" → datetime64. Undeclared columns keep their parsed dtype.
+SCHEMA = {
+    "Patients":      {"patient_Id": "id", "Date_Of_Birth": "date", "Gender": "category",
+                      "city": "category", "mode_of_payment": "category"},
+    "Appointment":   {"appointment_Id": "id", "patient_Id": "id", "doct_Id": "id",
+                      "appointment_Date": "date", "appointment_status": "category",
+                      "reason": "category"},
+    "BedRecords":    {"admission_Id": "id", "patient_Id": "id", "bed_No": "id",
+                      "admission_Date": "date", "discharge_Date": "date"},
+    "Bed":           {"bed_No": "id", "ward_No": "id"},
+    "Ward":          {"ward_No": "id", "ward_Name": "category", "dept_Id": "id"},
+    "Department":    {"dept_Id": "id", "dept_Name": "category"},
+    "Doctor":        {"doct_Id": "id", "dept_Id": "id"},
+    "Nurse":         {"nurse_Id": "id", "dept_Id": "id"},
+    "SurgeryRecord": {"surgery_Id": "id", "patient_Id": "id", "surgeon_Id": "id",
+                      "surgery_Date": "date", "surgery_Type": "category"},
+    "RoomRecords":   {"room_No": "id", "patient_Id": "id", "admission_Date": "date"},
+    "Room":          {"room_No": "id", "dept_Id": "id"},
+}
+
+_lock     = threading.Lock()
+_manifest = None
+
+
+# ── Workbook fingerprint ───────────────────────────────────────────────────────
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _manifest_path():
+    return os.path.join(SNAPSHOT_DIR, "manifest.json")
+
+def _read_manifest():
+    try:
+        with open(_manifest_path()) as f:
+            m = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if m.get("format") != SNAPSHOT_FORMAT:
+        return None
+    if not all(os.path.exists(os.path.join(SNAPSHOT_DIR, fn)) for fn in m["sheets"].values()):
+        return None
+    return m
+
+def _write_atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+def _write_manifest(m):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(m, f, indent=1)
+    _write_atomic(_manifest_path(), write)
+
+class _ProcessLock:
+    # Cross-process lock (lock file created with O_EXCL) so that several Streamlit
+    # workers sharing one data directory convert the workbook only once.
+    def __init__(self, path, timeout=300, stale=900):
+        self.path, self.timeout, self.stale = path, timeout, stale
+
+    def __enter__(self):
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    pass
+                if time.time() > deadline:
+                    raise TimeoutError(f"snapshot lock held: {self.path}")
+                time.sleep(0.2)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+# ── Excel → Arrow IPC conversion ───────────────────────────────────────────────
+# Sheets are stored as uncompressed Feather v2 files written as a single record
+# batch, so a reader can memory-map them: null-free numeric and datetime columns
+# become zero-copy views on the OS page cache, shared by every worker process.
+def _arrow_safe(df):
+    # Excel object columns can mix ints and strings (e.g. "N/A" in an ID column),
+    # which Arrow cannot type. Those columns are stored as strings.
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+# ── Declared schema ────────────────────────────────────────────────────────────
+def _narrow_id(s):
+    num = s if pd.api.types.is_numeric_dtype(s) else pd.to_numeric(s, errors="coerce")
+    if num.notna().sum() != s.notna().sum() or (num.dropna() % 1 != 0).any():
+        return s  # non-numeric or fractional IDs are left untouched
+    lo, hi = (num.min(), num.max()) if num.notna().any() else (0, 0)
+    for width in (8, 16, 32, 64):
+        info = np.iinfo(f"int{width}")
+        if info.min <= lo and hi <= info.max:
+            break
+    target = f"Int{width}" if num.isna().any() else f"int{width}"
+    return s if str(s.dtype) == target else num.astype(target)
+
+def _canonical_name(col, sheet):
+    col = str(col).strip()
+    return next((c for c in SCHEMA.get(sheet, {}) if c.lower() == col.lower()), col)
+
+def canonical_columns(df, sheet):
+    cols = [_canonical_name(c, sheet) for c in df.columns]
+    if cols != list(df.columns):
+        df.columns = cols
+    return df
+
+def apply_schema(df, sheet, columns=None):
+    canonical_columns(df, sheet)
+    for col, kind in SCHEMA.get(sheet, {}).items():
+        if col not in df.columns or (columns is not None and col not in columns):
+            continue
+        s = df[col]
+        if kind == "id":
+            out = _narrow_id(s)
+        elif kind == "category":
+            out = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+        elif kind == "date":
+            out = s if pd.api.types.is_datetime64_any_dtype(s) else pd.to_datetime(s, errors="coerce")
+        if out is not s:
+            df[col] = out
+    return df
+
+def _frame_hash(df):
+    h = hashlib.sha256()
+    h.update(repr([(c, str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+def _sheet_file(sheet, digest):
+    # File names carry the sheet's content hash: a new conversion never overwrites
+    # a file another worker still has mapped, and an unchanged sheet keeps its file.
+    safe = "".join(ch if ch.isalnum() else "_" for ch in sheet.strip())
+    return f"{safe}.{digest[:12]}.arrow"
+
+def _write_sheet(tmp, df):
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    feather.write_feather(table, tmp, compression="uncompressed", chunksize=max(len(df), 1))
+
+def _remove_stale(keep):
+    for fn in os.listdir(SNAPSHOT_DIR):
+        if fn.endswith((".arrow", ".parquet")) and fn not in keep:
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, fn))
+            except OSError:
+                pass  # still mapped on a platform that forbids unlinking
+
+def _convert(path, stat, digest):
+    sheets   = pd.read_excel(path, sheet_name=None)
+    files    = {}
+    versions = {}
+    for name, df in sheets.items():
+        df = apply_schema(df, name)
+        versions[name] = _frame_hash(df)
+        fn = _sheet_file(name, versions[name])
+        if not os.path.exists(os.path.join(SNAPSHOT_DIR, fn)):
+            _write_atomic(os.path.join(SNAPSHOT_DIR, fn), lambda tmp, df=df: _write_sheet(tmp, df))
+        files[name] = fn
+    m = {"format": SNAPSHOT_FORMAT, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+         "sha256": digest, "sheets": files, "versions": versions}
+    _write_manifest(m)
+    _remove_stale(set(files.values()))
+    return m
+
+def ensure_snapshot(path=EXCEL_PATH):
+    """Return the snapshot manifest for `path`, converting the workbook if it changed."""
+    global _manifest
+    if not HAS_ARROW:
+        return None
+    stat = os.stat(path)
+    with _lock:
+        m = _manifest or _read_manifest()
+        if m and m["size"] == stat.st_size and m["mtime_ns"] == stat.st_mtime_ns:
+            _manifest = m
+            return m
+        # size/mtime moved — only reconvert if the content actually changed
+        digest = _file_hash(path)
+        try:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            with _ProcessLock(os.path.join(SNAPSHOT_DIR, ".lock")):
+                # another worker may have converted while we waited for the lock
+                m = _read_manifest() or m
+                if m and m["sha256"] == digest:
+                    m = dict(m, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                    _write_manifest(m)
+                else:
+                    m = _convert(path, stat, digest)
+        except OSError:
+            # read-only deployment — fall back to parsing the workbook directly
+            return None
+        _manifest = m
+        return m
+
+
+# ── Readers used by the page loaders ───────────────────────────────────────────
+def sheet_names(path=EXCEL_PATH):
+    m = ensure_snapshot(path)
+    if m is None:
+        return pd.ExcelFile(path).sheet_names
+    return list(m["sheets"])
+
+def _resolve_sheet(sheet, names):
+    # Sheet lookup tolerates case and stray whitespace ("RoomRecords" vs "roomrecords ")
+    if sheet in names:
+        return sheet
+    key = sheet.strip().lower()
+    return next((n for n in names if n.strip().lower() == key), sheet)
+
+def read_sheet(sheet, usecols=None, path=EXCEL_PATH):
+    """Read one sheet; `usecols` (canonical names) projects the read, unknown names are skipped."""
+    m = ensure_snapshot(path)
+    if m is None:
+        sheet = _resolve_sheet(sheet, pd.ExcelFile(path).sheet_names)
+        wanted = None if usecols is None else (lambda c: _canonical_name(c, sheet) in usecols)
+        return pd.read_excel(path, sheet_name=sheet, usecols=wanted)
+    sheet = _resolve_sheet(sheet, m["sheets"])
+    # Mapping the file is free; only the selected columns are materialised
+    table = feather.read_table(os.path.join(SNAPSHOT_DIR, m["sheets"][sheet]), memory_map=True)
+    if usecols is not None:
+        table = table.select([c for c in usecols if c in table.column_names])
+    return table.to_pandas(split_blocks=True)
+
+def read_workbook(path=EXCEL_PATH):
+    return {name: read_sheet(name, path=path) for name in sheet_names(path)}
+
+
+# ── Incremental append ingest ──────────────────────────────────────────────────
+# The source system drops new rows into INCOMING_DIR as <Sheet>_<anything>.csv
+# (or .xlsx) files, e.g. Appointment_20261017T0930.csv. They are appended to the
+# cached sheet in file-name order without re-parsing the workbook. Files older
+# than the workbook are assumed to be folded into it by the next full export and
+# are ignored.
+def delta_files(sheet, path=EXCEL_PATH):
+    if sheet not in APPEND_SHEETS or not os.path.isdir(INCOMING_DIR):
+        return ()
+    base  = os.stat(path).st_mtime_ns
+    found = []
+    for fn in sorted(os.listdir(INCOMING_DIR)):
+        if fn.lower().startswith(sheet.lower() + "_") and fn.lower().endswith((".csv", ".xlsx")):
+            stat = os.stat(os.path.join(INCOMING_DIR, fn))
+            if stat.st_mtime_ns > base:
+                found.append((fn, stat.st_size, stat.st_mtime_ns))
+    return tuple(found)
+
+def _read_delta(sheet, fn):
+    src = os.path.join(INCOMING_DIR, fn)
+    df  = pd.read_csv(src) if fn.lower().endswith(".csv") else pd.read_excel(src)
+    return apply_schema(df, sheet)
+
+def _append_rows(base, delta, sheet=None):
+    if not len(delta):
+        return base
+    base, delta = base.copy(deep=False), delta.copy(deep=False)
+    # Extend categories instead of letting concat decay them to object
+    for col in delta.columns.intersection(base.columns):
+        if isinstance(base[col].dtype, pd.CategoricalDtype):
+            new = pd.Index(delta[col].astype(object).dropna().unique()).difference(base[col].cat.categories)
+            if len(new):
+                base[col] = base[col].cat.add_categories(new)
+            delta[col] = delta[col].astype(base[col].dtype)
+    out = pd.concat([base, delta], ignore_index=True)
+    # Both sides already carry the schema: only a column the concat had to widen
+    # or fill is narrowed again, not the whole sheet
+    if sheet is not None:
+        stale = [c for c in out.columns
+                 if c not in base.columns or c not in delta.columns or out[c].dtype != base[c].dtype]
+        if stale:
+            apply_schema(out, sheet, stale)
+    return out
+
+def load_delta(sheet, delta, columns=None):
+    """Rows of one appended file of `sheet`, as listed by delta_files()."""
+    columns = tuple(_canonical_name(c, sheet) for c in columns) if columns is not None else None
+    return _project(_cached_delta(sheet, *delta), columns)
+
+RUNNING_MAX    = 64
+_running       = OrderedDict()   # key → (version, deltas, value), least recently used first
+_running_locks = {}
+_running_lock  = threading.Lock()  # guards the two dicts, not the builds
+
+def _incremental(key, version, deltas, build, extend):
+    # Running value per key: if the deltas seen last time are a prefix of the
+    # current ones, only the new files are folded in; otherwise start from the
+    # base. Each key builds under its own lock, so one sheet's catch-up does not
+    # hold up readers of another.
+    with _running_lock:
+        lock = _running_locks.setdefault(key, threading.Lock())
+    with lock:
+        with _running_lock:
+            prev = _running.get(key)
+            if prev:
+                _running.move_to_end(key)
+        if prev and prev[0] == version and prev[1] == deltas:
+            return prev[2]
+        if prev and prev[0] == version and prev[1] == deltas[:len(prev[1])]:
+            value, todo = prev[2], deltas[len(prev[1]):]
+        else:
+            value, todo = build(), deltas
+        for d in todo:
+            value = extend(value, d)
+        with _running_lock:
+            _running[key] = (version, deltas, value)
+            _running.move_to_end(key)
+            while len(_running) > RUNNING_MAX:
+                old, _ = _running.popitem(last=False)
+                _running_locks.pop(old, None)
+        return value
+
+def incremental(key, sheets, build, extend, path=EXCEL_PATH):
+    """A value derived from `sheets`, kept current as files are appended to them.
+
+    build(version) covers the workbook rows and should be cached against
+    `version`; extend(value, sheet, delta) returns the value with one appended
+    file folded in (see load_delta()). Without appended files this is build().
+    """
+    version = tuple(_base_version(s, path) for s in sheets)
+    deltas  = [(s,) + d for s in sheets for d in delta_files(s, path)]
+    if not deltas:
+        return build(version)
+    if len({d[0] for d in deltas}) > 1:
+        # across sheets in arrival order; within one sheet it stays load_sheet()'s
+        deltas.sort(key=lambda d: (d[3], d))
+    return _incremental((key, path), version, tuple(deltas),
+                        lambda: build(version), lambda value, d: extend(value, d[0], d[1:]))
+
+
+# ── Shared table cache ─────────────────────────────────────────────────────────
+# Each sheet is cached under its own content hash, so saving the workbook only
+# reloads the sheets whose rows actually changed; an untouched workbook costs
+# one os.stat per rerun.
+def _base_version(sheet, path=EXCEL_PATH):
+    m = ensure_snapshot(path)
+    if m is None:
+        stat = os.stat(path)
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+    return m["versions"][_resolve_sheet(sheet, m["versions"])]
+
+def sheet_version(sheet, path=EXCEL_PATH):
+    version = _base_version(sheet, path)
+    deltas  = delta_files(sheet, path)
+    if deltas:
+        version += "+" + hashlib.sha256(repr(deltas).encode()).hexdigest()[:12]
+    return version
+
+def data_version(*sheets, path=EXCEL_PATH):
+    """Content fingerprint of the given sheets (or the whole workbook); derived caches are keyed by it."""
+    if not sheets:
+        m = ensure_snapshot(path)
+        if m is not None:
+            return m["sha256"]
+        stat = os.stat(path)
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+    return "-".join(sheet_version(s, path) for s in sheets)
+
+# ── Read-only resource cache ───────────────────────────────────────────────────
+# Cached frames live once per process (st.cache_resource, no pickling per rerun).
+# Their arrays are flagged read-only and callers receive a shallow copy, so adding
+# or replacing columns stays local. The copy is shallow: it is copy-on-write that
+# makes an in-place write (df.loc, .iloc, df[col] += …) copy the block instead of
+# going through to the cached arrays, and the read-only flags catch writes made
+# straight into .values. A slice or a derived frame shares the cached arrays until
+# something writes to it, so pages need no defensive .copy() calls.
+if int(pd.__version__.split(".")[0]) < 3:   # always on from pandas 3
+    pd.set_option("mode.copy_on_write", True)
+
+def _writable_arrays(df):
+    for blk in df._mgr.blocks:
+        vals = blk.values
+        if isinstance(vals, np.ndarray):
+            yield vals
+            continue
+        # Categorical → codes, DatetimeArray/StringArray → backing ndarray,
+        # Int64/boolean → values and mask; Arrow-backed arrays are immutable
+        for attr in ("_ndarray", "_data", "_mask"):
+            arr = getattr(vals, attr, None)
+            if isinstance(arr, np.ndarray):
+                yield arr
+
+def freeze(obj):
+    if isinstance(obj, pd.DataFrame):
+        for arr in _writable_arrays(obj):
+            arr.flags.writeable = False
+    elif isinstance(obj, (tuple, list)):
+        for item in obj:
+            freeze(item)
+    return obj
+
+def handout(obj):
+    if isinstance(obj, pd.DataFrame):
+        return obj.copy(deep=False)
+    if isinstance(obj, tuple):
+        return tuple(handout(item) for item in obj)
+    return obj
+
+def frozen_cache(**cache_kwargs):
+    """Like st.cache_resource, but the cached frames are frozen and handed out as shallow copies."""
+    def decorate(func):
+        @functools.wraps(func)
+        def build(*args, **kwargs):
+            return freeze(func(*args, **kwargs))
+        cached = st.cache_resource(**cache_kwargs)(build)
+
+        @functools.wraps(func)
+        def get(*args, **kwargs):
+            return handout(cached(*args, **kwargs))
+        get.clear = cached.clear
+        return get
+    return decorate
+
+def derived_table(*sheets, rows=None, columns=None, max_entries=4, **cache_kwargs):
+    """Cache an enriched table against the data version of the sheets it is built
+    from; the function's own arguments (and `path`) complete the key. Only the
+    last `max_entries` keys are kept.
+
+    With `rows`, the function maps rows of that fact sheet (its `columns`, plus
+    their position as `src_row`) to a frame, or a tuple of frames, row by row. It
+    then runs once over the workbook rows, and an appended file's rows are run
+    through it on their own and concatenated on.
+    """
+    def decorate(func):
+        if rows is None:
+            @frozen_cache(max_entries=max_entries, **cache_kwargs)
+            @functools.wraps(func)
+            def cached(version, *args, **kwargs):
+                return func(*args, **kwargs)
+
+            @functools.wraps(func)
+            def get(*args, path=EXCEL_PATH, **kwargs):
+                return cached(data_version(*sheets, path=path), *args, path=path, **kwargs)
+            get.clear = cached.clear
+            return get
+
+        @frozen_cache(max_entries=max_entries, **cache_kwargs)
+        @functools.wraps(func)
+        def cached(version, *args, path=EXCEL_PATH, **kwargs):
+            df = base_sheet(rows, path, columns)
+            return len(df), func(df.assign(src_row=np.arange(len(df))), *args, path=path, **kwargs)
+
+        @functools.wraps(func)
+        def get(*args, path=EXCEL_PATH, **kwargs):
+            def extend(value, sheet, delta):
+                n, table = value
+                df  = load_delta(sheet, delta, columns)
+                out = func(df.assign(src_row=np.arange(n, n + len(df))), *args, path=path, **kwargs)
+                if isinstance(table, tuple):
+                    out = tuple(_append_rows(t, o) for t, o in zip(table, out))
+                else:
+                    out = _append_rows(table, out)
+                return n + len(df), freeze(out)
+
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            return handout(incremental(key, sheets, lambda v: cached(v, *args, path=path, **kwargs),
+                                       extend, path)[1])
+        get.clear = cached.clear
+        return get
+    return decorate
+
+@frozen_cache(show_spinner="Loading data...", max_entries=64)
+def _cached_sheet(sheet, version, path, columns=None):
+    return apply_schema(read_sheet(sheet, usecols=columns, path=path), sheet)
+
+@frozen_cache(max_entries=64)
+def _cached_delta(sheet, fn, size, mtime_ns):
+    return _read_delta(sheet, fn)
+
+def _project(df, columns):
+    return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+def base_sheet(sheet, path=EXCEL_PATH, columns=None):
+    """The workbook rows of `sheet`, without appended files."""
+    columns = tuple(_canonical_name(c, sheet) for c in columns) if columns is not None else None
+    return _cached_sheet(sheet, _base_version(sheet, path), path, columns)
+
+def load_sheet(sheet, path=EXCEL_PATH, columns=None):
+    columns = tuple(_canonical_name(c, sheet) for c in columns) if columns is not None else None
+    df = incremental(("sheet", sheet, columns), (sheet,),
+                     lambda v: _cached_sheet(sheet, v[0], path, columns),
+                     lambda df, s, d: freeze(_append_rows(df, load_delta(s, d, columns), s)), path)
+    return handout(df)
+
+def load_tables(*sheets, path=EXCEL_PATH, columns=None):
+    """Load several sheets at once — each is parsed once per sheet version, shared by all pages.
+
+    `columns` maps a sheet to the columns the caller needs; only those are read
+    and cached. Sheets not listed are loaded whole.
+    """
+    columns = columns or {}
+    return tuple(load_sheet(s, path, columns.get(s)) for s in sheets)
+
+
+# ── Fact tables ────────────────────────────────────────────────────────────────
+# The four row-per-event sheets, the columns the aggregates need from each, and
+# the date each one is filtered and bucketed by. Their department is resolved
+# through the dimension sheets (doctor, ward or room → department).
+FACT_COLUMNS = {"Appointment":   ("appointment_Date", "appointment_status", "doct_Id"),
+                "BedRecords":    ("admission_Id", "admission_Date", "discharge_Date", "bed_No"),
+                "RoomRecords":   ("admission_Date", "room_No"),
+                "SurgeryRecord": ("surgery_Date", "surgery_Type", "surgeon_Id")}
+FACT_DATES   = {"Appointment": "appointment_Date", "BedRecords": "admission_Date",
+                "RoomRecords": "admission_Date",   "SurgeryRecord": "surgery_Date"}
+FACT_KEYS    = {"Appointment": ("doct_Id", "doct_Id"), "SurgeryRecord": ("surgeon_Id", "doct_Id"),
+                "BedRecords":  ("bed_No", "bed_No"),   "RoomRecords":   ("room_No", "room_No")}
+DIMENSION_SHEETS = ("Doctor", "Department", "Bed", "Ward", "Room")
+
+
+# ── Dimension lookups ──────────────────────────────────────────────────────────
+# Every dimension key gets an array from key value to row of its sheet, built once
+# per dimension version, and every link between dimension sheets (bed → ward →
+# department, doctor → department, room → department) an array from row to row.
+# Tagging a fact column with a department or ward is then a bounds check and a
+# take per hop instead of a hash merge. Keys that are not small non-negative
+# integers use a hash index instead; either way the first row with a key wins.
+DIMENSION_KEYS = {"doct_Id": "Doctor", "dept_Id": "Department", "bed_No": "Bed",
+                  "ward_No": "Ward", "room_No": "Room"}
+DENSE_LIMIT    = 1 << 24
+
+def _int_keys(values):
+    # int64 key values, -1 where missing or fractional; None when not numeric
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    if not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+        return None
+    if pd.api.types.is_integer_dtype(s) and not s.hasnans:
+        return s.to_numpy(dtype=np.int64)
+    f = s.to_numpy(dtype="float64", na_value=np.nan)
+    return np.where(np.isfinite(f) & (f == np.floor(f)), f, -1).astype(np.int64)
+
+def _follow(hop, rows):
+    out = np.full(len(rows), -1, dtype=np.int64)
+    ok  = rows >= 0
+    out[ok] = hop[rows[ok]]
+    return out
+
+class KeyIndex:
+    def __init__(self, keys):
+        keys      = pd.Series(keys).reset_index(drop=True)
+        first     = (keys.notna() & ~keys.duplicated()).to_numpy()
+        self.pos  = np.flatnonzero(first)
+        self.keys = pd.Index(keys[first])
+        self.dense = None
+        num = _int_keys(keys)
+        if num is not None and (num[first] >= 0).all() and num[first].max(initial=-1) < DENSE_LIMIT:
+            self.dense = np.full(num[first].max(initial=-1) + 1, -1, dtype=np.int64)
+            self.dense[num[first]] = self.pos
+
+    def rows(self, ids):
+        """Row of each id in the dimension sheet, -1 where there is none."""
+        num = _int_keys(ids) if self.dense is not None else None
+        if num is not None:
+            out = np.full(len(num), -1, dtype=np.int64)
+            ok  = (num >= 0) & (num < len(self.dense))
+            out[ok] = self.dense[num[ok]]
+            return out
+        return _follow(self.pos, self.keys.get_indexer(pd.Index(ids)))
+
+class Dimensions:
+    def __init__(self, sheets):
+        self.sheets  = sheets
+        self.index   = {k: KeyIndex(sheets[s][k]) for k, s in DIMENSION_KEYS.items() if k in sheets[s]}
+        self.links   = {s: [k for k, t in DIMENSION_KEYS.items() if t != s and k in df and k in self.index]
+                        for s, df in sheets.items()}
+        self.hops    = {(s, k): self.index[k].rows(sheets[s][k]) for s, ks in self.links.items() for k in ks}
+        self._values = {}
+
+    def _route(self, sheet, value, seen=()):
+        if value in self.sheets[sheet]:
+            return []
+        for link in self.links[sheet]:
+            if DIMENSION_KEYS[link] not in seen:
+                route = self._route(DIMENSION_KEYS[link], value, seen + (sheet,))
+                if route is not None:
+                    return [link] + route
+        return None
+
+    def lookup(self, ids, key, value):
+        """`value` for each id of dimension `key`, following links between the
+        dimension sheets as needed (NaN where a hop finds no row). Categorical
+        columns come back as a Categorical with the sheet's categories."""
+        sheet, rows = DIMENSION_KEYS[key], self.index[key].rows(ids)
+        route = self._route(sheet, value)
+        if route is None:
+            raise KeyError(f"{value} is not reachable from {key}")
+        for link in route:
+            rows  = _follow(self.hops[(sheet, link)], rows)
+            sheet = DIMENSION_KEYS[link]
+        col = self.sheets[sheet][value]
+        if (sheet, value) not in self._values:
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                self._values[(sheet, value)] = np.append(col.cat.codes.to_numpy(np.int64), -1)
+            else:
+                self._values[(sheet, value)] = np.append(np.asarray(col, dtype=object), np.nan)
+        taken = self._values[(sheet, value)][rows]   # row -1 → the trailing NaN / code -1
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            return pd.Categorical.from_codes(taken, dtype=col.dtype)
+        return taken
+
+@st.cache_resource(max_entries=4)
+def _dimension_index(versions, path):
+    return Dimensions({s: _cached_sheet(s, v, path) for s, v in zip(DIMENSION_SHEETS, versions)})
+
+def _dimensions(path=EXCEL_PATH):
+    return _dimension_index(tuple(_base_version(s, path) for s in DIMENSION_SHEETS), path)
+
+def lookup(ids, key, value, path=EXCEL_PATH):
+    """Tag a column of `key` ids (e.g. doct_Id, bed_No) with a dimension attribute
+    such as dept_Name, ward_Name or FName; keeps the index of `ids`."""
+    return pd.Series(_dimensions(path).lookup(ids, key, value), index=getattr(ids, "index", None))
+
+def fact_departments(sheet, df, path=EXCEL_PATH, dims=None):
+    """Department name of every row of a fact frame (NaN where it cannot be resolved)."""
+    col, key = FACT_KEYS[sheet]
+    return pd.Series((dims or _dimensions(path)).lookup(df[col], key, "dept_Name"), index=df.index)
+
+
+# ── Date dimension ─────────────────────────────────────────────────────────────
+# Months are keyed as int32 month counts since 1970-01 (the pandas monthly Period
+# ordinal), NO_MONTH for a missing date. One datetime64 cast computes them, the
+# groupbys run on the integers, and periods or labels are made only for the keys
+# of an aggregated result.
+NO_MONTH    = np.iinfo(np.int32).min
+MONTH_NAMES = np.array(["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                        "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], dtype=object)
+
+def month_keys(dates):
+    months = np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[M]")
+    return np.where(np.isnat(months), NO_MONTH, months.view("i8")).astype(np.int32)
+
+def month_count(dates):
+    """Number of distinct months among `dates` (missing dates ignored)."""
+    keys = month_keys(dates)
+    return len(np.unique(keys[keys != NO_MONTH]))
+
+def month_periods(keys):
+    keys = np.asarray(keys, dtype=np.int64)
+    return pd.PeriodIndex.from_ordinals(np.where(keys == NO_MONTH, np.iinfo(np.int64).min, keys), freq="M")
+
+def calendar(months):
+    """Date dimension rows for month keys or monthly periods, in the given order:
+    period, year, month number, month name and "%b %Y" label."""
+    if isinstance(getattr(months, "dtype", None), pd.PeriodDtype):
+        keys = pd.PeriodIndex(months).asi8
+    else:
+        keys = np.asarray(months, dtype=np.int64)
+    year  = keys // 12 + 1970
+    names = MONTH_NAMES[keys % 12]
+    return pd.DataFrame({"month": month_periods(keys), "year": year, "month_no": keys % 12 + 1,
+                         "month_name": names, "label": names + " " + year.astype(str).astype(object)},
+                        index=pd.Index(keys, name="key"))
+
+
+# ── Aggregate cube ─────────────────────────────────────────────────────────────
+# Row counts per fact × month × department × ward × status × surgery type, built
+# once per data version and extended from appended rows alone. Charts slice the
+# cube with cube_counts() instead of scanning the fact tables, so their cost no
+# longer grows with history. Dimensions that do not apply to a fact are NaN;
+# rows without a date keep a NO_MONTH key so per-department totals still count
+# them. The month dimension is stored as int32 keys and returned as periods.
+CUBE_DIMS = ("month", "dept_Name", "ward_Name", "appointment_status", "surgery_Type", "valid_stay")
+
+def _facts(sheet, df, dims):
+    out  = []
+    dept = fact_departments(sheet, df, dims=dims).astype(object)
+
+    def fact(name, date_col, **cols):
+        keys = pd.DataFrame({"month": month_keys(df[date_col]), "dept_Name": dept, **cols}, index=df.index)
+        for col in CUBE_DIMS:
+            if col not in keys:
+                keys[col] = True if col == "valid_stay" else np.nan
+        g = keys.groupby(list(CUBE_DIMS), dropna=False, observed=True).size()
+        out.append(g.rename("n").reset_index().assign(fact=name))
+
+    if sheet == "Appointment":
+        fact("appointments", "appointment_Date", appointment_status=df["appointment_status"].astype(object))
+    elif sheet == "BedRecords":
+        cols = dict(ward_Name=np.asarray(dims.lookup(df["bed_No"], "bed_No", "ward_Name"), dtype=object),
+                    valid_stay=~(df["discharge_Date"] < df["admission_Date"]) & df["admission_Id"].notna())
+        fact("admissions", "admission_Date", **cols)
+        fact("discharges", "discharge_Date", **cols)
+    elif sheet == "RoomRecords":
+        fact("room_admissions", "admission_Date")
+    elif sheet == "SurgeryRecord":
+        fact("surgeries", "surgery_Date", surgery_Type=df["surgery_Type"].astype(object))
+    return out
+
+def _rollup(parts):
+    cube = pd.concat(parts, ignore_index=True)
+    return freeze(cube.groupby(["fact", *CUBE_DIMS], dropna=False).n.sum().reset_index())
+
+def cube_from(facts, path=EXCEL_PATH, cube=None):
+    """Cube over the given fact frames ({sheet: frame}), e.g. the rows left after
+    filtering; with `cube`, their counts are added to it."""
+    dims = _dimensions(path)
+    return _rollup([*([] if cube is None else [cube]), *(f for s, df in facts.items() for f in _facts(s, df, dims))])
+
+@frozen_cache(max_entries=4)
+def _base_cube(version, path):
+    return cube_from({s: base_sheet(s, path, cols) for s, cols in FACT_COLUMNS.items()}, path)
+
+def load_cube(path=EXCEL_PATH):
+    """The aggregate cube for the current data version (one row per non-empty cell)."""
+    def extend(cube, sheet, delta):
+        return cube_from({sheet: load_delta(sheet, delta, FACT_COLUMNS[sheet])}, path, cube)
+
+    return handout(incremental("cube", (*FACT_COLUMNS, *DIMENSION_SHEETS),
+                               lambda v: _base_cube(v, path), extend, path))
+
+def cube_counts(fact, by=(), path=EXCEL_PATH, cube=None, **where):
+    """Slice the cube: counts of `fact` grouped by the `by` dimensions.
+
+    Each keyword filters one dimension by a value, a list of values, or a
+    predicate over the column (e.g. month=lambda m: m < cutoff). With no `by`
+    the total is returned as an int. `cube` slices a cube from cube_from()
+    instead of the full one.
+    """
+    cube = load_cube(path) if cube is None else cube
+    mask = cube["fact"] == fact
+    for dim, cond in where.items():
+        col = cube[dim] if dim != "month" else pd.Series(month_periods(cube["month"]), index=cube.index)
+        if callable(cond):
+            mask &= cond(col).fillna(False).astype(bool)
+        elif isinstance(cond, (list, tuple, set)):
+            mask &= col.isin(cond)
+        else:
+            mask &= col == cond
+    by   = (by,) if isinstance(by, str) else tuple(by)
+    if "month" in by:
+        mask &= cube["month"] != NO_MONTH
+    cube = cube[mask]
+    if not by:
+        return int(cube["n"].sum())
+    out = cube.groupby(list(by) if len(by) > 1 else by[0]).n.sum().astype("int64").sort_index()
+    if "month" in by:
+        if len(by) > 1:
+            level     = by.index("month")
+            out.index = out.index.set_levels(month_periods(out.index.levels[level]), level=level)
+        else:
+            out.index = pd.Index(month_periods(out.index), name="month")
+    return out
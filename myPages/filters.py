@@ -0,0 +1,301 @@
+import copy
+import functools
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from myPages.data import (EXCEL_PATH, FACT_COLUMNS, FACT_DATES, DIMENSION_SHEETS, load_sheet, base_sheet,
+                          load_delta, incremental, data_version, fact_departments, cube_from, cube_counts,
+                          freeze, frozen_cache, handout, _append_rows)
+
+# Filter engine for the sidebar Global Filters. Each fact sheet gets an index
+# built once per data version: its row order sorted by date (a date range is two
+# binary searches) and a packed bitmap per department and per appointment status
+# in that order. Applying a selection ORs the bitmaps of the chosen values and
+# ANDs the dimensions over the date slice only, so a filter change costs a few
+# vector operations on the selected range rather than a scan and re-merge.
+# Rows appended from INCOMING_DIR are indexed per file and added as segments.
+
+
+class GlobalFilters(NamedTuple):
+    start:    Optional[pd.Timestamp] = None   # inclusive, by day
+    end:      Optional[pd.Timestamp] = None
+    depts:    Optional[tuple] = None
+    statuses: Optional[tuple] = None          # appointments only
+
+
+# ── Index ──────────────────────────────────────────────────────────────────────
+class _Segment:
+    # Rows sorted by date, with a packed bitmap per dimension value in that order
+    def __init__(self, dates, dims):
+        keys       = dates.to_numpy("datetime64[ns]").view("i8").copy()
+        nat        = np.isnat(dates.to_numpy("datetime64[ns]"))
+        keys[nat]  = np.iinfo(np.int64).max      # undated rows sort last
+        self.order = np.argsort(keys, kind="stable")
+        self.keys  = keys[self.order]
+        self.n     = len(keys)
+        self.dated = int((~nat).sum())
+        self.bitmaps = {}
+        for dim, labels in dims.items():
+            codes, values = pd.factorize(np.asarray(labels, dtype=object)[self.order])
+            self.bitmaps[dim] = {v: np.packbits(codes == i) for i, v in enumerate(values)}
+        for arr in (self.order, self.keys, *(b for m in self.bitmaps.values() for b in m.values())):
+            arr.flags.writeable = False
+
+    def bounds(self):
+        if not self.dated:
+            return None, None
+        return pd.Timestamp(self.keys[0]), pd.Timestamp(self.keys[self.dated - 1])
+
+    def _bits(self, dim, values, lo, hi):
+        b0, b1 = lo // 8, (hi + 7) // 8
+        bits   = np.zeros(b1 - b0, dtype=np.uint8)
+        for v in values:
+            if v in self.bitmaps[dim]:
+                bits |= self.bitmaps[dim][v][b0:b1]
+        return np.unpackbits(bits)[lo - 8 * b0: hi - 8 * b0].view(bool)
+
+    def select(self, start=None, end=None, **dims):
+        lo, hi = 0, self.n
+        if start is not None:
+            lo = int(np.searchsorted(self.keys, pd.Timestamp(start).normalize().value, "left"))
+        if end is not None:
+            end = (pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).value
+            hi  = int(np.searchsorted(self.keys, end, "left"))
+        if start is not None or end is not None:
+            hi = min(hi, self.dated)   # a date range leaves out the undated rows
+        hi   = max(lo, hi)
+        mask = None
+        for dim, values in dims.items():
+            if values is None or dim not in self.bitmaps:
+                continue
+            m    = self._bits(dim, values, lo, hi)
+            mask = m if mask is None else mask & m
+        pos = self.order[lo:hi] if mask is None else self.order[lo:hi][mask]
+        return np.sort(pos)
+
+class FactIndex:
+    """Row positions of a fact sheet by date and dimension. The rows form sorted
+    segments (the workbook rows, then one per appended file) searched in turn."""
+    def __init__(self, dates, dims):
+        self.parts = (_Segment(dates, dims),)
+        self.n     = self.parts[0].n
+
+    def extend(self, other):
+        """This index followed by the rows of `other`."""
+        out       = copy.copy(self)
+        out.parts = self.parts + other.parts
+        out.n     = self.n + other.n
+        return out
+
+    def bounds(self):
+        found = [p.bounds() for p in self.parts if p.dated]
+        if not found:
+            return None, None
+        return min(lo for lo, _ in found), max(hi for _, hi in found)
+
+    def select(self, start=None, end=None, **dims):
+        """Positions (in sheet order) of the rows dated within [start, end] whose
+        value in each given dimension is one of the listed values (None: any)."""
+        out, offset = [], 0
+        for part in self.parts:
+            pos = part.select(start, end, **dims)
+            out.append(pos + offset if offset else pos)
+            offset += part.n
+        return out[0] if len(out) == 1 else np.concatenate(out)
+
+    def rows(self, f):
+        """Positions (in sheet order) of the rows matching GlobalFilters `f`."""
+        return self.select(f.start, f.end, dept_Name=f.depts, appointment_status=f.statuses)
+
+
+def _index(sheet, df, path):
+    dims = {"dept_Name": fact_departments(sheet, df, path)}
+    if sheet == "Appointment":
+        dims["appointment_status"] = df["appointment_status"]
+    return FactIndex(df[FACT_DATES[sheet]], dims)
+
+@st.cache_resource(max_entries=16)
+def _fact_index(sheet, version, path):
+    return _index(sheet, base_sheet(sheet, path, FACT_COLUMNS[sheet]), path)
+
+@st.cache_resource(max_entries=64)
+def _delta_index(sheet, delta, version, path):
+    return _index(sheet, load_delta(sheet, delta, FACT_COLUMNS[sheet]), path)
+
+def fact_index(sheet, path=EXCEL_PATH):
+    def extend(index, s, d):
+        return index.extend(_delta_index(s, d, data_version(*DIMENSION_SHEETS, path=path), path))
+    return incremental(("fact_index", sheet), (sheet, *DIMENSION_SHEETS),
+                       lambda v: _fact_index(sheet, v, path), extend, path)
+
+
+# ── Session filters ────────────────────────────────────────────────────────────
+def active_filters(path=EXCEL_PATH):
+    """The sidebar selection as GlobalFilters, or None when nothing narrows the data."""
+    ss    = st.session_state
+    dates = ss.get("global_date_filter")
+    depts = ss.get("global_dept_filter") or []
+    stats = ss.get("global_status_filter") or []
+    depts = None if not depts or "All Departments" in depts else tuple(sorted(depts))
+    stats = None if not stats or "All Status" in stats else tuple(sorted(stats))
+
+    start = end = None
+    if isinstance(dates, (tuple, list)) and len(dates) == 2:
+        lo, hi = fact_index("Appointment", path).bounds()
+        start, end = pd.Timestamp(dates[0]), pd.Timestamp(dates[1])
+        if lo is not None and start <= lo.normalize():
+            start = None
+        if hi is not None and end >= hi.normalize():
+            end = None
+
+    f = GlobalFilters(start, end, depts, stats)
+    return None if f == GlobalFilters() else f
+
+def _narrows(sheet, filters):
+    if filters is None or sheet not in FACT_DATES:
+        return False
+    return not (filters.depts is None and filters.start is None and filters.end is None
+                and (filters.statuses is None or sheet != "Appointment"))
+
+def rows(sheet, filters, path=EXCEL_PATH):
+    """Row positions of `sheet` selected by `filters`; None means every row."""
+    if not _narrows(sheet, filters):
+        return None
+    return fact_index(sheet, path).rows(filters)
+
+def apply(df, sheet, filters, path=EXCEL_PATH, row_col=None):
+    """Filter a frame of `sheet` rows (or a frame derived from one that carries
+    the source row position in `row_col`)."""
+    pos = rows(sheet, filters, path)
+    if pos is None:
+        return df
+    if row_col is None:
+        return df.take(pos)
+    keep = np.zeros(fact_index(sheet, path).n, dtype=bool)
+    keep[pos] = True
+    return df[keep[df[row_col].to_numpy()]]
+
+def filtered_tables(*sheets, filters=None, path=EXCEL_PATH, columns=None):
+    """load_tables() with the fact sheets narrowed to `filters`."""
+    columns = columns or {}
+    return tuple(apply(load_sheet(s, path, columns.get(s)), s, filters, path) for s in sheets)
+
+def _base_rows(sheet, filters, columns, path):
+    # the workbook rows of `sheet` narrowed to `filters`
+    df  = base_sheet(sheet, path, columns)
+    pos = rows(sheet, filters, path)
+    return df if pos is None else df.take(pos[:np.searchsorted(pos, len(df))])
+
+def _delta_rows(sheet, delta, filters, columns, path):
+    # one appended file's rows of `sheet` narrowed to `filters`
+    df = load_delta(sheet, delta, columns)
+    if not _narrows(sheet, filters):
+        return df
+    return df.take(_delta_index(sheet, delta, data_version(*DIMENSION_SHEETS, path=path), path).rows(filters))
+
+
+# ── Filtered aggregates ────────────────────────────────────────────────────────
+@frozen_cache(max_entries=16)
+def _filtered_cube(filters, version, path):
+    return cube_from({s: _base_rows(s, filters, cols, path) for s, cols in FACT_COLUMNS.items()}, path)
+
+def counts(fact, by=(), filters=None, path=EXCEL_PATH, **where):
+    """cube_counts() over the rows selected by `filters` (the full cube when None)."""
+    cube = None
+    if filters is not None:
+        def extend(cube, s, d):
+            return freeze(cube_from({s: _delta_rows(s, d, filters, FACT_COLUMNS[s], path)}, path, cube))
+        cube = handout(incremental(("counts", filters), (*FACT_COLUMNS, *DIMENSION_SHEETS),
+                                   lambda v: _filtered_cube(filters, v, path), extend, path))
+    return cube_counts(fact, by, path, cube=cube, **where)
+
+
+# ── Patient index ──────────────────────────────────────────────────────────────
+class PatientIndex:
+    """A sheet's rows stably sorted by patient_Id: one patient's rows are a slice
+    of each part (the workbook rows, then one part per appended file)."""
+    def __init__(self, df):
+        frame      = freeze(df[df["patient_Id"].notna()].sort_values("patient_Id", kind="stable"))
+        self.parts = ((frame, frame["patient_Id"].to_numpy()),)
+
+    def extend(self, other):
+        """This index followed by the rows of `other`."""
+        out       = copy.copy(self)
+        out.parts = self.parts + other.parts
+        return out
+
+    def lookup(self, pid):
+        found = []
+        for frame, keys in self.parts:
+            lo, hi = np.searchsorted(keys, pid, "left"), np.searchsorted(keys, pid, "right")
+            if hi > lo or not found:
+                found.append(frame.iloc[lo:hi])
+        return found[0] if len(found) == 1 else functools.reduce(_append_rows, found)
+
+@st.cache_resource(max_entries=16)
+def _patient_index(sheet, columns, filters, version, path):
+    return PatientIndex(_base_rows(sheet, filters, columns, path))
+
+def patient_rows(sheet, pid, filters=None, columns=None, path=EXCEL_PATH):
+    """Rows of `sheet` (narrowed to `filters`) for patient `pid`, in sheet order."""
+    columns = tuple(columns) if columns else None
+    def extend(index, s, d):
+        return index.extend(PatientIndex(_delta_rows(s, d, filters, columns, path)))
+    index = incremental(("patients", sheet, columns, filters), (sheet, *DIMENSION_SHEETS),
+                        lambda v: _patient_index(sheet, columns, filters, v, path), extend, path)
+    return index.lookup(pid)
+
+
+# ── Patient search ─────────────────────────────────────────────────────────────
+class PatientSearch:
+    """Typeahead over patient IDs and names: a sorted array of lower-cased keys (the
+    ID and each word of the name) answers prefix queries with two binary searches;
+    a substring scan only tops up short prefix results."""
+    def __init__(self, ids, names=None):
+        order    = np.argsort(ids, kind="stable")
+        self.ids = np.asarray(ids, dtype=object)[order]
+        if names is None:
+            self.labels = np.array([str(i) for i in self.ids], dtype=object)
+            words       = [()] * len(self.ids)
+        else:
+            names       = np.asarray(names, dtype=object)[order]
+            self.labels = np.array([f"{i}  —  {n}" for i, n in zip(self.ids, names)], dtype=object)
+            words       = [str(n).lower().split() if pd.notna(n) else () for n in names]
+        self.text = pd.Series(self.labels).str.lower()
+
+        keys = [str(i).lower() for i in self.ids]
+        rows = list(range(len(self.ids)))
+        for row, ws in enumerate(words):
+            keys += ws
+            rows += [row] * len(ws)
+        keys       = np.asarray(keys, dtype=object)
+        by_key     = np.argsort(keys, kind="stable")
+        self.keys  = keys[by_key]
+        self.rows  = np.asarray(rows)[by_key]
+
+    def search(self, text, limit=25):
+        """Row positions of up to `limit` patients matching `text`, prefix matches first."""
+        q = str(text or "").strip().lower()
+        if not q:
+            return np.arange(min(limit, len(self.ids)))
+        lo   = np.searchsorted(self.keys, q, "left")
+        hi   = np.searchsorted(self.keys, q + "\U0010ffff", "left")
+        hits = pd.unique(self.rows[lo:hi])[:limit]
+        if len(hits) < limit:
+            more = np.flatnonzero(self.text.str.contains(q, regex=False).to_numpy())
+            hits = pd.unique(np.concatenate([hits, more]))[:limit]
+        return hits
+
+@st.cache_resource(max_entries=4)
+def _patient_search(version, path):
+    patients = load_sheet("Patients", path)
+    name_col = next((c for c in patients.columns if c.lower() in ("fname", "name", "patient_name")), None)
+    patients = patients.dropna(subset=["patient_Id"]).drop_duplicates("patient_Id", keep="last")
+    return PatientSearch(patients["patient_Id"].to_numpy(),
+                         patients[name_col].to_numpy() if name_col else None)
+
+def patient_search(path=EXCEL_PATH):
+    return _patient_search(data_version("Patients", path=path), path)
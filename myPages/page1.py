@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from myPages.data import calendar
+from myPages.filters import active_filters, filtered_tables, counts
 
 def run():
     dark_mode = st.session_state.get('dark_mode', False)
@@ -31,7 +33,6 @@ def run():
         bdr            = '#E2E8F0'
         highlight_bg   = '#EFF6FF'
 
-    EXCEL_PATH  = "data/dataFinal.xlsx"
     MONTH_ORDER = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
     YEAR_COLORS = {2024: SECONDARY_BLUE, 2025: CORAL}
 
@@ -92,41 +93,32 @@ def run():
     st.markdown("<div class='page-title'>Healthcare Operations Intelligence Dashboard</div>", unsafe_allow_html=True)
     st.markdown("<div class='page-subtitle'>Real-time Operational Intelligence & Strategic Insights</div>", unsafe_allow_html=True)
 
-    @st.cache_data
-    def load_healthcare_data(path):
-        sheets = pd.read_excel(path, sheet_name=None)
-        sheets = {k.strip().lower(): v for k, v in sheets.items()}
-        dfs = [sheets[name].copy() for name in ["patients","appointment","surgeryrecord","roomrecords","room","bedrecords","department"]]
-        for df in dfs:
-            df.columns = df.columns.str.strip().str.lower()
-        if "appointment_date" in dfs[1].columns:
-            dfs[1]["appointment_date"] = pd.to_datetime(dfs[1]["appointment_date"], errors="coerce")
-        if "admission_date" in dfs[3].columns:
-            dfs[3]["admission_date"] = pd.to_datetime(dfs[3]["admission_date"], errors="coerce")
-        return dfs
-
-    pts, apps, surg, room_recs, rooms, bed, depts = load_healthcare_data(EXCEL_PATH)
-
-    apps["month"]      = apps["appointment_date"].dt.month
-    apps["month_name"] = apps["appointment_date"].dt.strftime("%b")
-    apps["year"]       = apps["appointment_date"].dt.year
-
-    monthly_counts = apps.groupby(["year","month","month_name"]).size().reset_index(name="Count").sort_values(["year","month"])
-    valid_years    = apps.groupby("year")["month"].nunique()
+    F = active_filters()
+    pts, apps, room_recs, bed = filtered_tables(
+        "Patients", "Appointment", "RoomRecords", "BedRecords",
+        columns={"Patients":    ("patient_Id",),
+                 "Appointment": ("appointment_Id",),
+                 "RoomRecords": ("patient_Id",),
+                 "BedRecords":  ("patient_Id",)}, filters=F)
+
+    # Monthly / status / department counts are slices of the shared aggregate cube
+    mc             = counts("appointments", "month", filters=F)
+    cal            = calendar(mc.index)
+    monthly_counts = pd.DataFrame({"year": cal["year"].to_numpy(), "month": cal["month_no"].to_numpy(),
+                                   "month_name": cal["month_name"].to_numpy(), "Count": mc.values})
+    valid_years    = monthly_counts.groupby("year")["month"].nunique()
     valid_years    = valid_years[valid_years >= 6].index.tolist()
     monthly_counts = monthly_counts[monthly_counts["year"].isin(valid_years)]
 
     # Use full data — no top-of-page filters
-    apps_f = apps.copy()
-    dept_flow_all = room_recs.merge(rooms, on="room_no", how="left").merge(depts, on="dept_id", how="left")
-    dept_flow_f   = dept_flow_all.copy()
+    status_counts_all = counts("appointments", "appointment_status", filters=F).sort_values(ascending=False)
 
     # ── KPIs ─────────────────────────────────────────────────────────────────
-    total_patients    = pts["patient_id"].nunique()
-    total_appointments= apps_f["appointment_id"].nunique()
-    admitted_patients = pd.concat([room_recs["patient_id"], bed["patient_id"]]).dropna()
+    total_patients    = pts["patient_Id"].nunique()
+    total_appointments= apps["appointment_Id"].nunique()
+    admitted_patients = pd.concat([room_recs["patient_Id"], bed["patient_Id"]]).dropna()
     total_admissions  = admitted_patients.nunique()
-    cancel_count      = apps_f["appointment_status"].astype(str).str.lower().isin(["cancelled","canceled"]).sum()
+    cancel_count      = counts("appointments", filters=F, appointment_status=lambda s: s.str.lower().isin(["cancelled","canceled"]))
     cancel_rate       = round((cancel_count / max(total_appointments, 1)) * 100, 2)
 
     st.markdown(f"""
@@ -141,11 +133,11 @@ def run():
     # ── Patient Flow Trends ────────────────────────────────────────────────────
     st.markdown("<div class='section-header'>Patient Flow Trends</div>", unsafe_allow_html=True)
 
-    if "appointment_date" in apps_f.columns and "admission_date" in room_recs.columns:
-        flow_apps = apps_f.dropna(subset=["appointment_date"]).groupby(apps_f["appointment_date"].dt.to_period("M")).size().rename("Appointments")
-        flow_adm  = room_recs.dropna(subset=["admission_date"]).groupby(room_recs["admission_date"].dt.to_period("M")).size().rename("Admissions")
+    if len(mc):
+        flow_apps = mc.rename("Appointments")
+        flow_adm  = counts("room_admissions", "month", filters=F).rename("Admissions")
         flow_data = pd.concat([flow_apps, flow_adm], axis=1).fillna(0)
-        flow_data.index = flow_data.index.to_timestamp().strftime('%b %Y')
+        flow_data.index = calendar(flow_data.index)["label"].to_numpy()
 
         x_vals     = list(flow_data.index)
         show_every = max(1, len(x_vals) // 6)
@@ -186,8 +178,8 @@ def run():
 
     oc1, oc2 = st.columns([3, 2], gap="large")
     with oc1:
-        if "appointment_status" in apps_f.columns:
-            status_counts = apps_f["appointment_status"].value_counts().reset_index()
+        if len(status_counts_all):
+            status_counts = status_counts_all.reset_index()
             status_counts.columns = ["Status", "Count"]
             colors = [PRIMARY_BLUE, SUCCESS_GREEN, WARNING_AMBER, '#94A3B8']
             fig_pie = go.Figure(data=[go.Pie(
@@ -212,10 +204,10 @@ def run():
     with oc2:
         st.markdown("<br>", unsafe_allow_html=True)
         st.markdown(f"<div style='font-size:18px;font-weight:800;color:{text_color};margin-bottom:14px;'>Status Breakdown</div>", unsafe_allow_html=True)
-        if "appointment_status" in apps_f.columns:
-            sc = apps_f["appointment_status"].value_counts()
+        if len(status_counts_all):
+            sc = status_counts_all
             for s, c in sc.items():
-                pct = round(c / len(apps_f) * 100, 1)
+                pct = round(c / len(apps) * 100, 1)
                 st.markdown(f"""<div style='display:flex;justify-content:space-between;
                     padding:12px 18px;border-radius:10px;margin:6px 0;
                     background:{card_bg};border:1px solid {bdr};'>
@@ -226,12 +218,12 @@ def run():
     # ── Department Demand ─────────────────────────────────────────────────────
     st.markdown("<div class='section-header'>Department Demand</div>", unsafe_allow_html=True)
 
-    dept_chart = dept_flow_f.groupby("dept_name").size().reset_index(name="Admissions").sort_values("Admissions", ascending=True)
+    dept_chart = counts("room_admissions", "dept_Name", filters=F).reset_index(name="Admissions").sort_values("Admissions", ascending=True)
 
     dc1, dc2 = st.columns([3, 1], gap="large")
     with dc1:
         fig_dept = go.Figure(go.Bar(
-            x=dept_chart["Admissions"], y=dept_chart["dept_name"], orientation="h",
+            x=dept_chart["Admissions"], y=dept_chart["dept_Name"], orientation="h",
             marker=dict(
                 color=dept_chart["Admissions"],
                 colorscale=[[0, SECONDARY_BLUE], [1, PRIMARY_BLUE]],
@@ -258,11 +250,11 @@ def run():
             avg_ad = dept_chart["Admissions"].mean()
             st.markdown(f"""<div class='insight-box'>
                 <div class='insight-title'>Top Department</div>
-                <div class='insight-text'><b>{top_d['dept_name']}</b> leads with {int(top_d['Admissions']):,} admissions.</div>
+                <div class='insight-text'><b>{top_d['dept_Name']}</b> leads with {int(top_d['Admissions']):,} admissions.</div>
             </div>""", unsafe_allow_html=True)
             st.markdown(f"""<div class='insight-box'>
                 <div class='insight-title'>Lowest Volume</div>
-                <div class='insight-text'><b>{low_d['dept_name']}</b> has {int(low_d['Admissions']):,} admissions.</div>
+                <div class='insight-text'><b>{low_d['dept_Name']}</b> has {int(low_d['Admissions']):,} admissions.</div>
             </div>""", unsafe_allow_html=True)
             st.markdown(f"""<div class='insight-box'>
                 <div class='insight-title'>Avg per Dept</div>
@@ -272,12 +264,11 @@ def run():
     # ── Peak Appointment Months ───────────────────────────────────────────────
     st.markdown("<div class='section-header'>Peak Appointment Months</div>", unsafe_allow_html=True)
 
-    mc_f = apps_f.groupby(["year","month","month_name"]).size().reset_index(name="Count").sort_values(["year","month"])
-    mc_f = mc_f[mc_f["year"].isin(valid_years)]
+    mc_f = monthly_counts
 
     fig_months = go.Figure()
     for year in sorted(mc_f["year"].unique()):
-        yd = mc_f[mc_f["year"] == year].copy()
+        yd = mc_f[mc_f["year"] == year]
         yd["month_name"] = pd.Categorical(yd["month_name"], categories=MONTH_ORDER, ordered=True)
         yd = yd.sort_values("month_name")
         fig_months.add_trace(go.Bar(
@@ -301,14 +292,12 @@ def run():
     # ── Appointment Completion Rate ───────────────────────────────────────────
     st.markdown("<div class='section-header'>Appointment Completion Rate</div>", unsafe_allow_html=True)
 
-    if "appointment_date" in apps_f.columns and "appointment_status" in apps_f.columns:
-        apps_f2 = apps_f.copy()
-        apps_f2["month_period"] = apps_f2["appointment_date"].dt.to_period("M")
-        monthly_total     = apps_f2.groupby("month_period").size()
-        monthly_completed = apps_f2[apps_f2["appointment_status"].astype(str).str.lower()=="completed"].groupby("month_period").size()
+    if len(mc):
+        monthly_total     = mc
+        monthly_completed = counts("appointments", "month", filters=F, appointment_status=lambda s: s.str.lower() == "completed")
         cr_data           = ((monthly_completed / monthly_total) * 100).fillna(0).reset_index()
         cr_data.columns   = ["Month","Completion Rate (%)"]
-        cr_data["Month"]  = cr_data["Month"].dt.to_timestamp().dt.strftime('%b %Y')
+        cr_data["Month"]  = calendar(cr_data["Month"])["label"].to_numpy()
 
         x_vals     = cr_data["Month"].tolist()
         show_every = max(1, len(x_vals) // 6)
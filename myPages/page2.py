@@ -2,6 +2,93 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
+from myPages.data import EXCEL_PATH, load_sheet, derived_table, calendar
+from myPages.filters import active_filters, apply, patient_rows, patient_search, counts
+
+CITY_COORDINATES = {
+    "Delhi": (28.6139, 77.2090, "Delhi"), "Mumbai": (19.0760, 72.8777, "Maharashtra"),
+    "Bangalore": (12.9716, 77.5946, "Karnataka"), "Chennai": (13.0827, 80.2707, "Tamil Nadu"),
+    "Kolkata": (22.5726, 88.3639, "West Bengal"), "Hyderabad": (17.3850, 78.4867, "Telangana"),
+    "Ahmedabad": (23.0225, 72.5714, "Gujarat"), "Pune": (18.5204, 73.8567, "Maharashtra"),
+    "Jaipur": (26.9124, 75.7873, "Rajasthan"), "Lucknow": (26.8467, 80.9462, "Uttar Pradesh"),
+    "Kanpur": (26.4499, 80.3319, "Uttar Pradesh"), "Nagpur": (21.1458, 79.0882, "Maharashtra"),
+    "Indore": (22.7196, 75.8577, "Madhya Pradesh"), "Bhopal": (23.2599, 77.4126, "Madhya Pradesh"),
+    "Visakhapatnam": (17.6868, 83.2185, "Andhra Pradesh"),
+}
+
+EVENT_COLUMNS = ["patient_Id", "Start", "Finish", "Category", "Label", "Detail", "Color"]
+
+# ── Journey events ─────────────────────────────────────────────────────────────
+def journey_events(appts, beds, surgs, colors):
+    """Timeline events for any number of patients, one row per appointment, stay
+    and surgery. `colors` maps "Completed", "Cancelled", "No-Show", "Appointment",
+    "Admission" and "Surgery" to the colours used for those events."""
+    appts = appts.dropna(subset=["appointment_Date"])
+    beds  = beds.dropna(subset=["admission_Date"])
+    surgs = surgs.dropna(subset=["surgery_Date"])
+
+    status = appts["appointment_status"].astype(str).str.strip()
+    low    = status.str.lower()
+    a = pd.DataFrame({
+        "patient_Id": appts["patient_Id"],
+        "Start":      appts["appointment_Date"],
+        "Finish":     appts["appointment_Date"] + pd.Timedelta(hours=1),
+        "Category":   "Appointment",
+        "Label":      "Appointment — " + status,
+        "Detail":     "Doctor: " + appts["doct_Id"].astype(str) + " | Reason: " + appts["reason"].astype(str),
+        "Color":      np.select([low.str.contains("complet", regex=False),
+                                 low.str.contains("cancel", regex=False),
+                                 low.str.contains("no", regex=False)],
+                                [colors["Completed"], colors["Cancelled"], colors["No-Show"]],
+                                colors["Appointment"]),
+    })
+
+    discharged = beds["discharge_Date"].notna()
+    finish     = beds["discharge_Date"].where(discharged, beds["admission_Date"] + pd.Timedelta(days=1))
+    los        = (beds["discharge_Date"] - beds["admission_Date"]).dt.days
+    b = pd.DataFrame({
+        "patient_Id": beds["patient_Id"],
+        "Start":      beds["admission_Date"],
+        "Finish":     finish,
+        "Category":   "Admission",
+        "Label":      "Inpatient Stay",
+        "Detail":     "Bed: " + beds["bed_No"].astype(str)
+                      + " | LOS: " + los.astype("Int64").astype(str).where(los.notna(), "N/A")
+                      + " days | Discharge: " + finish.dt.strftime("%d %b %Y").where(discharged, "Pending"),
+        "Color":      colors["Admission"],
+    })
+
+    stype = surgs["surgery_Type"].astype(str)
+    s = pd.DataFrame({
+        "patient_Id": surgs["patient_Id"],
+        "Start":      surgs["surgery_Date"],
+        "Finish":     surgs["surgery_Date"] + pd.Timedelta(hours=3),
+        "Category":   "Surgery",
+        "Label":      stype,
+        "Detail":     "Surgeon ID: " + surgs["surgeon_Id"].astype(str) + " | Type: " + stype,
+        "Color":      colors["Surgery"],
+    })
+    frames = [f for f in (a, b, s) if len(f)] or [a]
+    return pd.concat(frames, ignore_index=True)[EVENT_COLUMNS]
+
+# ── Derived tables ─────────────────────────────────────────────────────────────
+@derived_table("Appointment", "Patients", rows="Appointment", columns=("patient_Id", "reason"))
+def _demographics(appointments, path=EXCEL_PATH):
+    # src_row is kept for the Global Filters
+    return appointments.merge(load_sheet("Patients", path), on="patient_Id", how="left")
+
+@derived_table("Patients")
+def _city_counts(path=EXCEL_PATH):
+    patients = load_sheet("Patients", path, ("city",))
+    patients["city"] = patients["city"].astype(str).str.strip().str.title()
+    city_counts_map = patients.groupby("city").size().reset_index(name="Patient_Count")
+
+    def get_coordinates(city_name):
+        return CITY_COORDINATES.get(city_name, (None, None, None))
+
+    city_counts_map[["lat","lon","state"]] = city_counts_map["city"].apply(lambda x: pd.Series(get_coordinates(x)))
+    return city_counts_map.dropna().nlargest(15, "Patient_Count")
 
 def run():
     dark_mode = st.session_state.get('dark_mode', False)
@@ -81,50 +168,39 @@ def run():
     st.markdown("<div class='page-title'>Patient Demographics & Demand Analysis</div>", unsafe_allow_html=True)
     st.markdown("<div class='page-subtitle'>Comprehensive insights into patient populations, service demand patterns & care journeys</div>", unsafe_allow_html=True)
 
-    @st.cache_data
-    def load_data():
-        file_path    = "data/dataFinal.xlsx"
-        patients     = pd.read_excel(file_path, sheet_name="Patients")
-        appointments = pd.read_excel(file_path, sheet_name="Appointment")
-        bed_records  = pd.read_excel(file_path, sheet_name="BedRecords")
-        surgeries    = pd.read_excel(file_path, sheet_name="SurgeryRecord")
-        doctors      = pd.read_excel(file_path, sheet_name="Doctor")
-        depts        = pd.read_excel(file_path, sheet_name="Department")
-        return patients, appointments, bed_records, surgeries, doctors, depts
-
-    patients, appointments, bed_records, surgeries, doctors, depts = load_data()
-
-    data = pd.merge(appointments, patients, on="patient_Id", how="left")
-    data["appointment_Date"] = pd.to_datetime(data["appointment_Date"], errors="coerce")
-    data["Date_Of_Birth"]    = pd.to_datetime(data["Date_Of_Birth"],    errors="coerce")
-    today = pd.Timestamp.today()
-    data["Age"]      = (today - data["Date_Of_Birth"]).dt.days // 365
+    F = active_filters()
+    data = apply(_demographics(), "Appointment", F, row_col="src_row")
+    # Age moves with the calendar, so it is worked out per run instead of cached per day
     bins   = [0, 18, 30, 45, 60, 75, 100]
     labels = ["0-18","19-30","31-45","46-60","61-75","76+"]
-    data["Age_Group"]  = pd.cut(data["Age"], bins=bins, labels=labels)
-    data["Month"]      = data["appointment_Date"].dt.month
-    data["Month_Name"] = data["appointment_Date"].dt.strftime("%b")
-    data["Year"]       = data["appointment_Date"].dt.year
-
-    bed_records["admission_Date"]  = pd.to_datetime(bed_records["admission_Date"],  errors="coerce")
-    bed_records["discharge_Date"]  = pd.to_datetime(bed_records["discharge_Date"],  errors="coerce")
-    bed_records["LOS"]             = (bed_records["discharge_Date"] - bed_records["admission_Date"]).dt.days
-    surgeries["surgery_Date"]      = pd.to_datetime(surgeries["surgery_Date"], errors="coerce")
+    data["Age"]       = (pd.Timestamp.today().normalize() - data["Date_Of_Birth"]).dt.days // 365
+    data["Age_Group"] = pd.cut(data["Age"], bins=bins, labels=labels)
+    if data["Age"].isna().all():
+        st.info("No data for the selected filters")
+        return
 
     MONTH_ORDER = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
 
-    monthly_counts = data.groupby(["Year","Month","Month_Name"]).size().reset_index(name="Count").sort_values(["Year","Month"])
-    valid_years    = data.groupby("Year")["Month"].nunique()
+    mc             = counts("appointments", "month", filters=F)
+    cal            = calendar(mc.index)
+    monthly_counts = pd.DataFrame({"Year": cal["year"].to_numpy(), "Month": cal["month_no"].to_numpy(),
+                                   "Month_Name": cal["month_name"].to_numpy(), "Count": mc.values})
+    valid_years    = monthly_counts.groupby("Year")["Month"].nunique()
     valid_years    = valid_years[valid_years >= 6].index.tolist()
     monthly_counts = monthly_counts[monthly_counts["Year"].isin(valid_years)]
 
     st.sidebar.markdown(f"<h3 style='color:{PRIMARY_BLUE};font-size:16px;font-weight:800;'>Page Filters</h3>", unsafe_allow_html=True)
     min_age        = int(data["Age"].min())
     max_age        = int(data["Age"].max())
-    age_range      = st.sidebar.slider("Select Age Range", min_value=min_age, max_value=max_age, value=(min_age, max_age))
+    age_range      = (min_age, max_age)
+    if min_age < max_age:
+        age_range  = st.sidebar.slider("Select Age Range", min_value=min_age, max_value=max_age, value=(min_age, max_age))
     gender_options = data["Gender"].dropna().unique().tolist()
     selected_gender= st.sidebar.multiselect("Select Gender", options=gender_options, default=gender_options)
     filtered_data  = data[(data["Age"].between(age_range[0], age_range[1])) & (data["Gender"].isin(selected_gender))]
+    if filtered_data.empty:
+        st.info("No data for the selected filters")
+        return
 
     most_common_reason = filtered_data["reason"].mode()[0] if not filtered_data["reason"].isna().all() else "N/A"
     peak_age_group     = filtered_data["Age_Group"].mode()[0] if not filtered_data["Age_Group"].isna().all() else "N/A"
@@ -148,135 +224,90 @@ def run():
     # ══════════════════════════════════════════════════════════════════════════
     # PATIENT JOURNEY TIMELINE
     # ══════════════════════════════════════════════════════════════════════════
-    st.markdown("<div class='section-header'>Patient Journey Timeline</div>", unsafe_allow_html=True)
-    st.caption("Select a patient to view their complete care pathway — appointments, admissions, discharges, and surgeries.")
-
-    all_ids  = sorted(patients["patient_Id"].dropna().unique().tolist())
-    name_col = next((c for c in patients.columns if c.lower() in ("fname","name","patient_name")), None)
-    nm_map   = patients.set_index("patient_Id")[name_col].to_dict() if name_col else {}
-    options  = [f"{pid}  —  {nm_map.get(pid,'')}" for pid in all_ids] if name_col else [str(p) for p in all_ids]
-    opt_map  = dict(zip(options, all_ids))
-
-    sel = st.selectbox("Search patient by ID / Name", options, key="p2_j_sel")
-    pid = opt_map.get(sel)
-
-    if pid:
-        rows = []
-        # Appointments
-        pa = appointments[appointments["patient_Id"] == pid][["appointment_Date","appointment_status","doct_Id","reason"]]\
-                         .dropna(subset=["appointment_Date"])
-        pa["appointment_Date"] = pd.to_datetime(pa["appointment_Date"], errors="coerce")
-        for _, r in pa.iterrows():
-            st_ = str(r["appointment_status"]).strip()
-            clr = SUCCESS_GREEN if "complet" in st_.lower() else CORAL if "cancel" in st_.lower() else \
-                  "#FBBF24" if "no" in st_.lower() else SECONDARY_BLUE
-            rows.append(dict(
-                Start=r["appointment_Date"],
-                Finish=r["appointment_Date"] + pd.Timedelta(hours=1),
-                Category="Appointment",
-                Label=f"Appointment — {st_}",
-                Detail=f"Doctor: {r['doct_Id']} | Reason: {r.get('reason','N/A')}",
-                Color=clr
-            ))
-        # Admissions + Discharges
-        pb = bed_records[bed_records["patient_Id"] == pid][["admission_Date","discharge_Date","bed_No","LOS"]]\
-                        .dropna(subset=["admission_Date"])
-        for _, r in pb.iterrows():
-            fin = r["discharge_Date"] if pd.notna(r["discharge_Date"]) else r["admission_Date"] + pd.Timedelta(days=1)
-            los = int(r["LOS"]) if pd.notna(r["LOS"]) else "N/A"
-            rows.append(dict(
-                Start=r["admission_Date"], Finish=fin,
-                Category="Admission",
-                Label="Inpatient Stay",
-                Detail=f"Bed: {r['bed_No']} | LOS: {los} days | Discharge: {fin.strftime('%d %b %Y') if pd.notna(r['discharge_Date']) else 'Pending'}",
-                Color=PRIMARY_BLUE
-            ))
-        # Surgeries
-        ps = surgeries[surgeries["patient_Id"] == pid][["surgery_Date","surgery_Type","surgeon_Id"]]\
-                      .dropna(subset=["surgery_Date"])
-        for _, r in ps.iterrows():
-            rows.append(dict(
-                Start=r["surgery_Date"],
-                Finish=r["surgery_Date"] + pd.Timedelta(hours=3),
-                Category="Surgery",
-                Label=str(r["surgery_Type"]),
-                Detail=f"Surgeon ID: {r['surgeon_Id']} | Type: {r['surgery_Type']}",
-                Color=PURPLE
-            ))
-
-        if not rows:
-            st.info("No recorded events found for this patient.")
-        else:
-            ev = pd.DataFrame(rows).sort_values("Start").reset_index(drop=True)
-            fig_j = px.timeline(
-                ev, x_start="Start", x_end="Finish", y="Category",
-                color="Category",
-                color_discrete_map={"Appointment": SECONDARY_BLUE, "Admission": PRIMARY_BLUE, "Surgery": PURPLE},
-                hover_name="Label",
-                hover_data={"Detail": True, "Start": True, "Finish": False, "Category": False}
-            )
-            fig_j.update_yaxes(categoryorder="array", categoryarray=["Appointment","Admission","Surgery"],
-                               tickfont=TICK_FONT)
-            fig_j.update_layout(
-                xaxis=dict(tickfont=TICK_FONT, showgrid=True, gridcolor=GRID_COLOR,
-                           title="Date", title_font=TITLE_FONT),
-                yaxis=dict(title=""),
-                height=300, margin=dict(l=20, r=20, t=40, b=60),
-                plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
-                showlegend=True,
-                legend=dict(font=dict(size=13, color=text_color), orientation="h", y=1.1, x=0,
-                            bgcolor='rgba(0,0,0,0)')
-            )
-            st.plotly_chart(fig_j, use_container_width=True, config={"displayModeBar": False})
-
-            # Summary metrics for this patient
-            m1, m2, m3, m4 = st.columns(4)
-            n_appts   = len(pa)
-            n_admits  = len(pb)
-            n_surgs   = len(ps)
-            avg_los_p = pb["LOS"].mean() if len(pb) > 0 else 0
-            for col, lbl, val in [
-                (m1, "Appointments",  n_appts),
-                (m2, "Admissions",    n_admits),
-                (m3, "Surgeries",     n_surgs),
-                (m4, "Avg LOS (days)", f"{avg_los_p:.1f}" if avg_los_p else "N/A")
-            ]:
-                col.markdown(f"""<div style='background:linear-gradient(135deg,{PRIMARY_BLUE},{SECONDARY_BLUE});
+    # Fragment: searching or picking a patient reruns only this section
+    @st.fragment
+    def patient_journey():
+        st.markdown("<div class='section-header'>Patient Journey Timeline</div>", unsafe_allow_html=True)
+        st.caption("Select a patient to view their complete care pathway — appointments, admissions, discharges, and surgeries.")
+
+        # Typeahead: matching runs server-side, only the top matches reach the widget
+        search   = patient_search()
+        sc1, sc2 = st.columns([1, 2])
+        with sc1:
+            q = st.text_input("Search patient by ID / Name", key="p2_j_q", placeholder="Type an ID or name")
+        hits    = search.search(q)
+        opt_map = dict(zip(search.labels[hits], search.ids[hits]))
+        with sc2:
+            sel = st.selectbox(f"Matching patients ({len(opt_map)})", list(opt_map), key="p2_j_sel")
+        pid = opt_map.get(sel)
+
+        if pid:
+            # Per-patient index: each lookup is a slice, not a scan of the sheet
+            pa = patient_rows("Appointment", pid, F, ("patient_Id","appointment_Date","appointment_status","doct_Id","reason"))
+            pb = patient_rows("BedRecords", pid, F, ("patient_Id","admission_Date","discharge_Date","bed_No"))
+            ps = patient_rows("SurgeryRecord", pid, F, ("patient_Id","surgery_Date","surgery_Type","surgeon_Id"))
+            ev = journey_events(pa, pb, ps, {"Completed": SUCCESS_GREEN, "Cancelled": CORAL, "No-Show": "#FBBF24",
+                                             "Appointment": SECONDARY_BLUE, "Admission": PRIMARY_BLUE, "Surgery": PURPLE})
+
+            if ev.empty:
+                st.info("No recorded events found for this patient.")
+            else:
+                ev = ev.sort_values("Start").reset_index(drop=True)
+                fig_j = px.timeline(
+                    ev, x_start="Start", x_end="Finish", y="Category",
+                    color="Category",
+                    color_discrete_map={"Appointment": SECONDARY_BLUE, "Admission": PRIMARY_BLUE, "Surgery": PURPLE},
+                    hover_name="Label",
+                    hover_data={"Detail": True, "Start": True, "Finish": False, "Category": False}
+                )
+                fig_j.update_yaxes(categoryorder="array", categoryarray=["Appointment","Admission","Surgery"],
+                                   tickfont=TICK_FONT)
+                fig_j.update_layout(
+                    xaxis=dict(tickfont=TICK_FONT, showgrid=True, gridcolor=GRID_COLOR,
+                               title="Date", title_font=TITLE_FONT),
+                    yaxis=dict(title=""),
+                    height=300, margin=dict(l=20, r=20, t=40, b=60),
+                    plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
+                    showlegend=True,
+                    legend=dict(font=dict(size=13, color=text_color), orientation="h", y=1.1, x=0,
+                                bgcolor='rgba(0,0,0,0)')
+                )
+                st.plotly_chart(fig_j, use_container_width=True, config={"displayModeBar": False})
+
+                # Summary metrics for this patient
+                m1, m2, m3, m4 = st.columns(4)
+                n_events  = ev["Category"].value_counts()
+                n_appts   = n_events.get("Appointment", 0)
+                n_admits  = n_events.get("Admission", 0)
+                n_surgs   = n_events.get("Surgery", 0)
+                stays     = pb.dropna(subset=["admission_Date"])
+                avg_los_p = (stays["discharge_Date"] - stays["admission_Date"]).dt.days.mean() if len(stays) > 0 else 0
+                for col, lbl, val in [
+                    (m1, "Appointments",  n_appts),
+                    (m2, "Admissions",    n_admits),
+                    (m3, "Surgeries",     n_surgs),
+                    (m4, "Avg LOS (days)", f"{avg_los_p:.1f}" if avg_los_p else "N/A")
+                ]:
+                    col.markdown(f"""<div style='background:linear-gradient(135deg,{PRIMARY_BLUE},{SECONDARY_BLUE});
                     padding:14px;border-radius:12px;text-align:center;'>
                     <div style='font-size:12px;font-weight:800;color:rgba(255,255,255,0.85);
                     text-transform:uppercase;letter-spacing:1px;margin-bottom:6px;'>{lbl}</div>
                     <div style='font-size:28px;font-weight:900;color:white;'>{val}</div>
                 </div>""", unsafe_allow_html=True)
 
-            st.markdown("<br>", unsafe_allow_html=True)
-            with st.expander("Full Event Log", expanded=False):
-                d = ev[["Start","Category","Label","Detail"]].copy()
-                d["Start"] = d["Start"].dt.strftime("%d %b %Y")
-                st.dataframe(d, use_container_width=True, hide_index=True)
+                st.markdown("<br>", unsafe_allow_html=True)
+                with st.expander("Full Event Log", expanded=False):
+                    d = ev[["Start","Category","Label","Detail"]]
+                    d["Start"] = d["Start"].dt.strftime("%d %b %Y")
+                    st.dataframe(d, use_container_width=True, hide_index=True)
+
+    patient_journey()
 
     # ── Map ────────────────────────────────────────────────────────────────────
     st.markdown("<div class='section-header'>Patient Distribution Across India</div>", unsafe_allow_html=True)
 
-    city_coordinates = {
-        "Delhi": (28.6139, 77.2090, "Delhi"), "Mumbai": (19.0760, 72.8777, "Maharashtra"),
-        "Bangalore": (12.9716, 77.5946, "Karnataka"), "Chennai": (13.0827, 80.2707, "Tamil Nadu"),
-        "Kolkata": (22.5726, 88.3639, "West Bengal"), "Hyderabad": (17.3850, 78.4867, "Telangana"),
-        "Ahmedabad": (23.0225, 72.5714, "Gujarat"), "Pune": (18.5204, 73.8567, "Maharashtra"),
-        "Jaipur": (26.9124, 75.7873, "Rajasthan"), "Lucknow": (26.8467, 80.9462, "Uttar Pradesh"),
-        "Kanpur": (26.4499, 80.3319, "Uttar Pradesh"), "Nagpur": (21.1458, 79.0882, "Maharashtra"),
-        "Indore": (22.7196, 75.8577, "Madhya Pradesh"), "Bhopal": (23.2599, 77.4126, "Madhya Pradesh"),
-        "Visakhapatnam": (17.6868, 83.2185, "Andhra Pradesh"),
-    }
-
-    patients_copy = patients.copy()
-    patients_copy["city"] = patients_copy["city"].astype(str).str.strip().str.title()
-    city_counts_map = patients_copy.groupby("city").size().reset_index(name="Patient_Count")
 
-    def get_coordinates(city_name):
-        return city_coordinates.get(city_name, (None, None, None))
-
-    city_counts_map[["lat","lon","state"]] = city_counts_map["city"].apply(lambda x: pd.Series(get_coordinates(x)))
-    city_counts_mapped = city_counts_map.dropna().nlargest(15, "Patient_Count")
+    city_counts_mapped = _city_counts()
 
     if len(city_counts_mapped) > 0:
         min_val = city_counts_mapped["Patient_Count"].min()
@@ -306,6 +337,7 @@ def run():
     st.markdown("<div class='section-header'>Gender Distribution</div>", unsafe_allow_html=True)
 
     gender_counts = filtered_data["Gender"].value_counts()
+    gender_counts = gender_counts[gender_counts > 0]
     fig1 = go.Figure(data=[go.Pie(
         labels=gender_counts.index, values=gender_counts.values, hole=0.5,
         marker=dict(colors=[CORAL, SECONDARY_BLUE, SUCCESS_GREEN], line=dict(color='white', width=4)),
@@ -352,7 +384,8 @@ def run():
     # ── Top 10 Cities ──────────────────────────────────────────────────────────
     st.markdown("<div class='section-header'>Top 10 Cities by Patient Count</div>", unsafe_allow_html=True)
 
-    city_counts_top = filtered_data["city"].value_counts().head(10).reset_index()
+    city_counts_top = filtered_data["city"].value_counts()
+    city_counts_top = city_counts_top[city_counts_top > 0].head(10).reset_index()
     city_counts_top.columns = ["City","Patients"]
     city_counts_top = city_counts_top.sort_values("Patients", ascending=True)
 
@@ -375,6 +408,7 @@ def run():
     st.markdown("<div class='section-header'>Payment Methods</div>", unsafe_allow_html=True)
 
     payment_counts = filtered_data["mode_of_payment"].value_counts()
+    payment_counts = payment_counts[payment_counts > 0]
     fig_pay = go.Figure(data=[go.Pie(
         labels=payment_counts.index, values=payment_counts.values, hole=0,
         marker=dict(colors=[SUCCESS_GREEN, SECONDARY_BLUE, PURPLE, CORAL, "#FBBF24", "#06B6D4"],
@@ -399,7 +433,7 @@ def run():
     line_styles = {2024: dict(color=SECONDARY_BLUE, width=5), 2025: dict(color=CORAL, width=5)}
 
     for year in sorted(monthly_counts["Year"].unique()):
-        yd = monthly_counts[monthly_counts["Year"] == year].copy()
+        yd = monthly_counts[monthly_counts["Year"] == year]
         yd["Month_Name"] = pd.Categorical(yd["Month_Name"], categories=MONTH_ORDER, ordered=True)
         yd = yd.sort_values("Month_Name")
         style = line_styles.get(year, dict(color="#95A5A6", width=3))
@@ -410,15 +444,16 @@ def run():
             hovertemplate=f"<b>{year}</b><br>%{{x}}: %{{y:,}}<extra></extra>"
         ))
 
-    peak_row = monthly_counts.loc[monthly_counts["Count"].idxmax()]
-    fig_line.add_annotation(
-        x=peak_row["Month_Name"], y=peak_row["Count"],
-        text=f"Peak: {int(peak_row['Count'])}",
-        showarrow=True, arrowhead=2, arrowcolor=CORAL, arrowwidth=3,
-        font=dict(color=CORAL, size=14, family="Arial Black"),
-        yshift=15, bgcolor="rgba(255,255,255,0.9)",
-        bordercolor=CORAL, borderwidth=2, borderpad=6
-    )
+    if len(monthly_counts):
+        peak_row = monthly_counts.loc[monthly_counts["Count"].idxmax()]
+        fig_line.add_annotation(
+            x=peak_row["Month_Name"], y=peak_row["Count"],
+            text=f"Peak: {int(peak_row['Count'])}",
+            showarrow=True, arrowhead=2, arrowcolor=CORAL, arrowwidth=3,
+            font=dict(color=CORAL, size=14, family="Arial Black"),
+            yshift=15, bgcolor="rgba(255,255,255,0.9)",
+            bordercolor=CORAL, borderwidth=2, borderpad=6
+        )
     fig_line.update_xaxes(tickmode='array', tickvals=MONTH_ORDER[::4], ticktext=MONTH_ORDER[::4])
     fig_line.update_layout(
         xaxis_title="<b>Month</b>", yaxis_title="<b>Appointments</b>",
@@ -2,7 +2,35 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
 from plotly.subplots import make_subplots
+from myPages.data import EXCEL_PATH, load_tables, derived_table, calendar, lookup
+from myPages.filters import FactIndex, active_filters, filtered_tables, counts
+from myPages.sqlstore import query, doctor_dept_counts, SURGEON_DEPT_SQL
+
+# ── Surgery fact ───────────────────────────────────────────────────────────────
+# Surgeries joined once per data version to the surgeon's department, with a
+# bitmap per department, surgery type and year. The filter bar and the sidebar
+# Global Filters only combine bitmaps; the joins are not redone on a rerun.
+@derived_table("Patients", "Doctor", "Department", "SurgeryRecord")
+def _surgery_facts(path=EXCEL_PATH):
+    patients, surgeries = load_tables(
+        "Patients", "SurgeryRecord", path=path,
+        columns={"Patients":      ("patient_Id",),
+                 "SurgeryRecord": ("patient_Id", "surgeon_Id", "surgery_Date", "surgery_Type")})
+    df = surgeries.merge(patients, on="patient_Id")
+    df["dept_Name"] = lookup(df["surgeon_Id"], "doct_Id", "dept_Name", path)
+
+    index = FactIndex(df["surgery_Date"], {"dept_Name":    df["dept_Name"],
+                                           "surgery_Type": df["surgery_Type"],
+                                           "year":         df["surgery_Date"].dt.year.astype("Int64")})
+    # one code per department × type × surgeon group, counted with bincount
+    cols     = ["dept_Name", "surgery_Type", "surgeon_Id"]
+    key      = df.groupby(cols, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    _, first = np.unique(key, return_index=True)
+    groups   = df[cols].iloc[first].reset_index(drop=True)
+    key.flags.writeable = False
+    return index, key, groups
 
 def run():
     dark_mode = st.session_state.get('dark_mode', False)
@@ -85,180 +113,188 @@ def run():
     st.markdown("<div class='page-title'>Clinical & Disease Intelligence</div>", unsafe_allow_html=True)
     st.markdown("<div class='page-subtitle'>Comprehensive medical patterns and surgical analytics for strategic clinical insights</div>", unsafe_allow_html=True)
 
-    @st.cache_data
-    def load_data():
-        file_path   = "data/dataFinal.xlsx"
-        patients    = pd.read_excel(file_path, sheet_name="Patients")
-        doctors     = pd.read_excel(file_path, sheet_name="Doctor")
-        departments = pd.read_excel(file_path, sheet_name="Department")
-        surgeries   = pd.read_excel(file_path, sheet_name="SurgeryRecord")
-        return patients, doctors, departments, surgeries
-
-    patients, doctors, departments, surgeries = load_data()
-
-    surgeries["surgery_Date"] = pd.to_datetime(surgeries["surgery_Date"], errors="coerce")
-
-    # ── Interactive Filters ────────────────────────────────────────────────────
-    st.markdown("<div class='filter-bar'>", unsafe_allow_html=True)
-    fc1, fc2, fc3 = st.columns(3)
-    with fc1:
-        all_depts   = departments['dept_Name'].dropna().unique().tolist()
-        sel_dept    = st.multiselect("Department", all_depts, key="p3_dept")
-    with fc2:
-        all_stypes  = sorted(surgeries['surgery_Type'].dropna().unique().tolist())
-        sel_stype   = st.multiselect("Surgery Type", all_stypes, key="p3_stype")
-    with fc3:
-        yr_opts     = sorted(surgeries["surgery_Date"].dt.year.dropna().unique().astype(int).tolist())
-        sel_yrs     = st.multiselect("Year", yr_opts, default=yr_opts, key="p3_yr")
-    st.markdown("</div>", unsafe_allow_html=True)
-
-    df = pd.merge(patients, surgeries, on='patient_Id', how='left')
-    df = pd.merge(df, doctors[['doct_Id','dept_Id']], left_on='surgeon_Id', right_on='doct_Id', how='left').drop(columns=['doct_Id'])
-    df = pd.merge(df, departments, on='dept_Id', how='left')
-
-    current = df.copy()
-    if sel_dept:  current = current[current['dept_Name'].isin(sel_dept)]
-    if sel_stype: current = current[current['surgery_Type'].isin(sel_stype)]
-    if sel_yrs:
-        current = current[current['surgery_Date'].dt.year.isin(sel_yrs)]
-
-    # ── KPIs — 3 cards (Total Patients removed) ──────────────────────────────
-    col1, col2, col3 = st.columns(3)
-    for col, lbl, val in [
-        (col1, "Unique Procedures", current['surgery_Type'].nunique()),
-        (col2, "Active Surgeons",   current['surgeon_Id'].nunique()),
-        (col3, "Departments",       current['dept_Name'].nunique()),
-    ]:
-        col.markdown(f"""<div class="kpi-box">
+    F = active_filters()
+    departments, surgeries = filtered_tables(
+        "Department", "SurgeryRecord",
+        columns={"SurgeryRecord": ("patient_Id", "surgeon_Id", "surgery_Date", "surgery_Type")}, filters=F)
+    if surgeries.empty:
+        st.info("No data for the selected filters")
+        return
+
+    # Fragment: the filter bar reruns only itself and the KPIs and charts it drives
+    @st.fragment
+    def filtered_section():
+        # ── Interactive Filters ────────────────────────────────────────────────────
+        st.markdown("<div class='filter-bar'>", unsafe_allow_html=True)
+        fc1, fc2, fc3 = st.columns(3)
+        with fc1:
+            all_depts   = departments['dept_Name'].dropna().unique().tolist()
+            sel_dept    = st.multiselect("Department", all_depts, key="p3_dept")
+        with fc2:
+            all_stypes  = sorted(surgeries['surgery_Type'].dropna().unique().tolist())
+            sel_stype   = st.multiselect("Surgery Type", all_stypes, key="p3_stype")
+        with fc3:
+            yr_opts     = sorted(surgeries["surgery_Date"].dt.year.dropna().unique().astype(int).tolist())
+            sel_yrs     = st.multiselect("Year", yr_opts, default=yr_opts, key="p3_yr")
+        st.markdown("</div>", unsafe_allow_html=True)
+
+        # ── Filtered surgery counts by department × type × surgeon ───────────────
+        # Every chart below the KPIs only needs these counts: select the matching
+        # surgeries from the bitmaps and count them per group.
+        index, key, groups = _surgery_facts()
+        depts = sel_dept or None
+        if F is not None and F.depts is not None:   # status does not apply to surgeries
+            depts = [d for d in F.depts if depts is None or d in depts]
+        pos = index.select(F.start if F else None, F.end if F else None,
+                           dept_Name=depts, surgery_Type=sel_stype or None, year=sel_yrs or None)
+        n       = np.bincount(key[pos], minlength=len(groups))
+        current = groups.assign(n=n)[n > 0].reset_index(drop=True)
+        if current.empty:
+            st.info("No data for the selected filters")
+            return
+
+        dept_totals  = current.groupby('dept_Name', observed=True)['n'].sum().sort_values(ascending=False)
+        stype_totals = current.groupby('surgery_Type', observed=True)['n'].sum().sort_values(ascending=False)
+
+        # ── KPIs — 3 cards (Total Patients removed) ──────────────────────────────
+        col1, col2, col3 = st.columns(3)
+        for col, lbl, val in [
+            (col1, "Unique Procedures", current['surgery_Type'].nunique()),
+            (col2, "Active Surgeons",   current['surgeon_Id'].nunique()),
+            (col3, "Departments",       current['dept_Name'].nunique()),
+        ]:
+            col.markdown(f"""<div class="kpi-box">
             <div class="kpi-label">{lbl}</div>
             <div class="kpi-value">{val}</div>
         </div>""", unsafe_allow_html=True)
-    st.markdown("<br><br>", unsafe_allow_html=True)
+        st.markdown("<br><br>", unsafe_allow_html=True)
+
+        # ── Chart 1: Top 10 Surgeries — Sorted Horizontal Bar ────────────────────
+        st.markdown("<div class='section-header'>Most Common Surgical Procedures</div>", unsafe_allow_html=True)
+
+        top_surg = counts("surgeries", "surgery_Type", filters=F).sort_values(ascending=False).head(10).reset_index()
+        top_surg.columns = ['Surgery','Count']
+        top_surg = top_surg.sort_values('Count', ascending=True)
+
+        tc1, tc2 = st.columns([3, 1], gap="large")
+        with tc1:
+            fig1 = go.Figure(go.Bar(
+                x=top_surg['Count'], y=top_surg['Surgery'], orientation='h',
+                marker=dict(
+                    color=top_surg['Count'],
+                    colorscale=[[0, SECONDARY_BLUE],[0.5, '#7C3AED'],[1, '#C026D3']],
+                    showscale=True,
+                    colorbar=dict(
+                        title=dict(text="<b>Count</b>", font=dict(size=13, family="Arial Black", color=text_color)),
+                        tickfont=dict(size=12, family="Arial Black", color=text_color),
+                        thickness=15, len=0.7
+                    ),
+                    line=dict(color='white', width=1), cornerradius=6
+                ),
+                hovertemplate='<b>%{y}</b><br>Count: %{x:,}<extra></extra>'
+            ))
+            fig1.update_layout(
+                xaxis_title="<b>Number of Cases</b>", yaxis_title="",
+                xaxis=dict(tickfont=TICK_FONT, title_font=TITLE_FONT, showgrid=True, gridcolor=grid_color),
+                yaxis=dict(tickfont=TICK_FONT),
+                height=500, margin=dict(l=20, r=80, t=20, b=50),
+                plot_bgcolor=plot_bg, paper_bgcolor=paper_bg, showlegend=False
+            )
+            st.plotly_chart(fig1, use_container_width=True, config={'displayModeBar': False})
+        with tc2:
+            st.markdown("<br><br>", unsafe_allow_html=True)
+            top1 = top_surg.iloc[-1]
+            total_surgs = top_surg["Count"].sum()
+            st.markdown(f"""<div class='insight-box'>
+            <div class='insight-title'>#1 Procedure</div>
+            <div class='insight-text'><b>{top1['Surgery']}</b> with {int(top1['Count']):,} cases.</div>
+        </div>""", unsafe_allow_html=True)
+            if len(top_surg) > 1:
+                top2 = top_surg.iloc[-2]
+                st.markdown(f"""<div class='insight-box'>
+            <div class='insight-title'>#2 Procedure</div>
+            <div class='insight-text'><b>{top2['Surgery']}</b> with {int(top2['Count']):,} cases.</div>
+        </div>""", unsafe_allow_html=True)
+            st.markdown(f"""<div class='insight-box'>
+            <div class='insight-title'>Total (Top 10)</div>
+            <div class='insight-text'>{total_surgs:,} combined cases across top 10 procedures.</div>
+        </div>""", unsafe_allow_html=True)
 
-    # ── Chart 1: Top 10 Surgeries — Sorted Horizontal Bar ────────────────────
-    st.markdown("<div class='section-header'>Most Common Surgical Procedures</div>", unsafe_allow_html=True)
+        # ── Chart 2: Surgery Distribution by Department ───────────────────────────
+        st.markdown("<div class='section-header'>Surgery Distribution by Department</div>", unsafe_allow_html=True)
 
-    top_surg = surgeries['surgery_Type'].value_counts().head(10).reset_index()
-    top_surg.columns = ['Surgery','Count']
-    top_surg = top_surg.sort_values('Count', ascending=True)
+        dept_counts = dept_totals[dept_totals > 0].reset_index()
+        dept_counts.columns = ['dept_Name','Surgeries']
+        dept_counts = dept_counts.sort_values('Surgeries', ascending=True)
 
-    tc1, tc2 = st.columns([3, 1], gap="large")
-    with tc1:
-        fig1 = go.Figure(go.Bar(
-            x=top_surg['Count'], y=top_surg['Surgery'], orientation='h',
+        fig4 = go.Figure(go.Bar(
+            x=dept_counts['Surgeries'],
+            y=dept_counts['dept_Name'],
+            orientation='h',
             marker=dict(
-                color=top_surg['Count'],
-                colorscale=[[0, SECONDARY_BLUE],[0.5, '#7C3AED'],[1, '#C026D3']],
+                color=dept_counts['Surgeries'],
+                colorscale=[[0, SECONDARY_BLUE],[0.5, PRIMARY_BLUE],[1, PURPLE]],
                 showscale=True,
                 colorbar=dict(
-                    title=dict(text="<b>Count</b>", font=dict(size=13, family="Arial Black", color=text_color)),
+                    title=dict(text="<b>Surgeries</b>", font=dict(size=13, family="Arial Black", color=text_color)),
                     tickfont=dict(size=12, family="Arial Black", color=text_color),
                     thickness=15, len=0.7
                 ),
-                line=dict(color='white', width=1), cornerradius=6
+                line=dict(color='white', width=1.5), cornerradius=6
             ),
-            hovertemplate='<b>%{y}</b><br>Count: %{x:,}<extra></extra>'
+            hovertemplate='<b>%{y}</b><br>Surgeries: %{x:,}<extra></extra>'
         ))
-        fig1.update_layout(
-            xaxis_title="<b>Number of Cases</b>", yaxis_title="",
+        fig4.update_layout(
+            xaxis_title="<b>Number of Surgeries</b>", yaxis_title="",
             xaxis=dict(tickfont=TICK_FONT, title_font=TITLE_FONT, showgrid=True, gridcolor=grid_color),
             yaxis=dict(tickfont=TICK_FONT),
             height=500, margin=dict(l=20, r=80, t=20, b=50),
             plot_bgcolor=plot_bg, paper_bgcolor=paper_bg, showlegend=False
         )
-        st.plotly_chart(fig1, use_container_width=True, config={'displayModeBar': False})
-    with tc2:
-        st.markdown("<br><br>", unsafe_allow_html=True)
-        top1 = top_surg.iloc[-1]
-        top2 = top_surg.iloc[-2]
-        total_surgs = top_surg["Count"].sum()
-        st.markdown(f"""<div class='insight-box'>
-            <div class='insight-title'>#1 Procedure</div>
-            <div class='insight-text'><b>{top1['Surgery']}</b> with {int(top1['Count']):,} cases.</div>
-        </div>""", unsafe_allow_html=True)
-        st.markdown(f"""<div class='insight-box'>
-            <div class='insight-title'>#2 Procedure</div>
-            <div class='insight-text'><b>{top2['Surgery']}</b> with {int(top2['Count']):,} cases.</div>
-        </div>""", unsafe_allow_html=True)
-        st.markdown(f"""<div class='insight-box'>
-            <div class='insight-title'>Total (Top 10)</div>
-            <div class='insight-text'>{total_surgs:,} combined cases across top 10 procedures.</div>
-        </div>""", unsafe_allow_html=True)
+        st.plotly_chart(fig4, use_container_width=True, config={'displayModeBar': False})
 
-    # ── Chart 2: Surgery Distribution by Department ───────────────────────────
-    st.markdown("<div class='section-header'>Surgery Distribution by Department</div>", unsafe_allow_html=True)
-
-    dept_counts = current['dept_Name'].value_counts().reset_index()
-    dept_counts.columns = ['dept_Name','Surgeries']
-    dept_counts = dept_counts.sort_values('Surgeries', ascending=True)
-
-    fig4 = go.Figure(go.Bar(
-        x=dept_counts['Surgeries'],
-        y=dept_counts['dept_Name'],
-        orientation='h',
-        marker=dict(
-            color=dept_counts['Surgeries'],
-            colorscale=[[0, SECONDARY_BLUE],[0.5, PRIMARY_BLUE],[1, PURPLE]],
-            showscale=True,
-            colorbar=dict(
-                title=dict(text="<b>Surgeries</b>", font=dict(size=13, family="Arial Black", color=text_color)),
-                tickfont=dict(size=12, family="Arial Black", color=text_color),
-                thickness=15, len=0.7
-            ),
-            line=dict(color='white', width=1.5), cornerradius=6
-        ),
-        hovertemplate='<b>%{y}</b><br>Surgeries: %{x:,}<extra></extra>'
-    ))
-    fig4.update_layout(
-        xaxis_title="<b>Number of Surgeries</b>", yaxis_title="",
-        xaxis=dict(tickfont=TICK_FONT, title_font=TITLE_FONT, showgrid=True, gridcolor=grid_color),
-        yaxis=dict(tickfont=TICK_FONT),
-        height=500, margin=dict(l=20, r=80, t=20, b=50),
-        plot_bgcolor=plot_bg, paper_bgcolor=paper_bg, showlegend=False
-    )
-    st.plotly_chart(fig4, use_container_width=True, config={'displayModeBar': False})
+        # ── Chart 3: Department-wise Surgery Type Distribution ────────────────────
+        st.markdown("<div class='section-header'>Department-wise Surgery Type Distribution</div>", unsafe_allow_html=True)
 
-    # ── Chart 3: Department-wise Surgery Type Distribution ────────────────────
-    st.markdown("<div class='section-header'>Department-wise Surgery Type Distribution</div>", unsafe_allow_html=True)
+        top_depts  = dept_totals[dept_totals > 0].head(5).index
+        top_stypes = stype_totals[stype_totals > 0].head(5).index
+        dm = current[current['dept_Name'].isin(top_depts) & current['surgery_Type'].isin(top_stypes)]
+        dm = dm.groupby(['dept_Name','surgery_Type'], observed=True)['n'].sum().reset_index(name='Count')
 
-    top_depts  = current['dept_Name'].value_counts().head(5).index
-    top_stypes = current['surgery_Type'].value_counts().head(5).index
-    dm = current[current['dept_Name'].isin(top_depts) & current['surgery_Type'].isin(top_stypes)]
-    dm = dm.groupby(['dept_Name','surgery_Type']).size().reset_index(name='Count')
+        GROUP_COLORS = [PRIMARY_BLUE,'#0891b2', SUCCESS_GREEN, CORAL, PURPLE]
 
-    GROUP_COLORS = [PRIMARY_BLUE,'#0891b2', SUCCESS_GREEN, CORAL, PURPLE]
-
-    fig5 = px.bar(
-        dm, x='dept_Name', y='Count', color='surgery_Type',
-        barmode='group', color_discrete_sequence=GROUP_COLORS,
-        labels={'dept_Name':'Department','Count':'Number of Cases','surgery_Type':'Surgery Type'}
-    )
-    fig5.update_traces(
-        marker=dict(cornerradius=4),
-        hovertemplate='<b>%{fullData.name}</b><br>%{x}: %{y} cases<extra></extra>'
-    )
-    fig5.update_layout(
-        xaxis_title="<b>Department</b>", yaxis_title="<b>Number of Cases</b>",
-        xaxis=dict(tickfont=TICK_FONT, title_font=TITLE_FONT, showgrid=False),
-        yaxis=dict(tickfont=TICK_FONT, title_font=TITLE_FONT, showgrid=True, gridcolor=grid_color),
-        height=480, margin=dict(l=60, r=40, t=30, b=60),
-        plot_bgcolor=plot_bg, paper_bgcolor=paper_bg,
-        legend=dict(
-            title=dict(text="<b>Surgery Type</b>", font=dict(size=13, color=text_color)),
-            font=dict(size=12, color=text_color, family="Arial Black"),
-            orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1,
-            bgcolor='rgba(0,0,0,0)'
+        fig5 = px.bar(
+            dm, x='dept_Name', y='Count', color='surgery_Type',
+            barmode='group', color_discrete_sequence=GROUP_COLORS,
+            labels={'dept_Name':'Department','Count':'Number of Cases','surgery_Type':'Surgery Type'}
         )
-    )
-    st.plotly_chart(fig5, use_container_width=True, config={'displayModeBar': False})
+        fig5.update_traces(
+            marker=dict(cornerradius=4),
+            hovertemplate='<b>%{fullData.name}</b><br>%{x}: %{y} cases<extra></extra>'
+        )
+        fig5.update_layout(
+            xaxis_title="<b>Department</b>", yaxis_title="<b>Number of Cases</b>",
+            xaxis=dict(tickfont=TICK_FONT, title_font=TITLE_FONT, showgrid=False),
+            yaxis=dict(tickfont=TICK_FONT, title_font=TITLE_FONT, showgrid=True, gridcolor=grid_color),
+            height=480, margin=dict(l=60, r=40, t=30, b=60),
+            plot_bgcolor=plot_bg, paper_bgcolor=paper_bg,
+            legend=dict(
+                title=dict(text="<b>Surgery Type</b>", font=dict(size=13, color=text_color)),
+                font=dict(size=12, color=text_color, family="Arial Black"),
+                orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1,
+                bgcolor='rgba(0,0,0,0)'
+            )
+        )
+        st.plotly_chart(fig5, use_container_width=True, config={'displayModeBar': False})
+
+    filtered_section()
 
     # ── Chart 4: Surgery Trend Over Time ─────────────────────────────────────
     st.markdown("<div class='section-header'>Surgery Trend Over Time</div>", unsafe_allow_html=True)
 
-    surgery_trend_df = surgeries.copy()
-    surgery_trend_df['Month_Year'] = surgery_trend_df['surgery_Date'].dt.strftime('%b %Y')
-    surgery_trend_df['Sort_Date']  = surgery_trend_df['surgery_Date'].dt.to_period('M')
-    surgery_trend = surgery_trend_df.groupby(['Month_Year','Sort_Date']).size().reset_index(name="Count").sort_values('Sort_Date')
+    st_month      = counts("surgeries", "month", filters=F)
+    surgery_trend = pd.DataFrame({'Month_Year': calendar(st_month.index)['label'].to_numpy(),
+                                  'Sort_Date':  st_month.index, 'Count': st_month.values})
 
     x_vals2    = surgery_trend['Month_Year'].tolist()
     show_every2= max(1, len(x_vals2) // 6)
@@ -283,11 +319,9 @@ def run():
     # ── Chart 5: Doctor-Department Surgery Heatmap ───────────────────────────
     st.markdown("<div class='section-header'>Doctor–Department Surgery Heatmap</div>", unsafe_allow_html=True)
 
-    surg_heat  = surgeries.copy()
-    doc_dept   = doctors.merge(departments, on='dept_Id', how='left')[['doct_Id','FName','dept_Name']]
-    surg_heat  = surg_heat.merge(doc_dept, left_on='surgeon_Id', right_on='doct_Id', how='inner')
-    surg_heat  = surg_heat.dropna(subset=['FName','dept_Name'])
-    heat_counts= surg_heat.groupby(['FName','dept_Name']).size().reset_index(name='Count')
+    heat_counts= query(SURGEON_DEPT_SQL) if F is None else None
+    if heat_counts is None:
+        heat_counts= doctor_dept_counts(surgeries['surgeon_Id'])
     top10      = heat_counts.groupby('FName')['Count'].sum().nlargest(10).index
     heat_counts= heat_counts[heat_counts['FName'].isin(top10)]
     pivot      = heat_counts.pivot(index='FName', columns='dept_Name', values='Count').fillna(0)
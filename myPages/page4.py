@@ -2,6 +2,18 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
+from myPages.data import EXCEL_PATH, derived_table, calendar, month_count, lookup
+from myPages.filters import active_filters, filtered_tables, apply, counts
+
+# ── Derived tables ─────────────────────────────────────────────────────────────
+@derived_table("BedRecords", "Bed", "Ward", "Department", rows="BedRecords")
+def _bed_stays(bed_records, path=EXCEL_PATH):
+    # src_row is kept for the Global Filters
+    df = bed_records.assign(ward_Name=lookup(bed_records["bed_No"], "bed_No", "ward_Name", path),
+                            dept_Name=lookup(bed_records["bed_No"], "bed_No", "dept_Name", path))
+
+    df['Length_of_Stay']  = (df['discharge_Date'] - df['admission_Date']).dt.days
+    return df[df['Length_of_Stay'].isna() | (df['Length_of_Stay'] >= 0)]
 
 def run():
     dark_mode = st.session_state.get('dark_mode', False)
@@ -81,33 +93,17 @@ def run():
     st.markdown("<div class='page-subtitle'>Comprehensive analysis of bed utilization, patient flow, and operational performance metrics</div>", unsafe_allow_html=True)
 
     # ── Load Data ──────────────────────────────────────────────────────────────
-    @st.cache_data
-    def load_data():
-        file_path   = "data/dataFinal.xlsx"
-        xls         = pd.ExcelFile(file_path)
-        bed_records = xls.parse("BedRecords")
-        bed         = xls.parse("Bed")
-        ward        = xls.parse("Ward")
-        department  = xls.parse("Department")
-        appointments= xls.parse("Appointment")
-        nurses      = xls.parse("Nurse")
-
-        df = bed_records.merge(bed, on="bed_No", how="left")
-        df = df.merge(ward, on="ward_No", how="left")
-        df = df.merge(department, on="dept_Id", how="left")
-
-        df['admission_Date']  = pd.to_datetime(df['admission_Date'])
-        df['discharge_Date']  = pd.to_datetime(df['discharge_Date'])
-        df['Length_of_Stay']  = (df['discharge_Date'] - df['admission_Date']).dt.days
-        appointments["appointment_Date"] = pd.to_datetime(appointments["appointment_Date"], errors="coerce")
-        return df[df['Length_of_Stay'].isna() | (df['Length_of_Stay'] >= 0)], appointments, nurses
-
-    df, appointments, nurses = load_data()
-    df_completed = df.dropna(subset=["discharge_Date"]).copy()
+    F  = active_filters()
+    df = apply(_bed_stays(), "BedRecords", F, row_col="src_row")
+    if df.empty:
+        st.info("No data for the selected filters")
+        return
+    appointments, nurses = filtered_tables("Appointment", "Nurse", filters=F,
+                                           columns={"Appointment": ("appointment_status",), "Nurse": ("nurse_Id",)})
     cutoff_date  = pd.Timestamp("2025-12-01")
 
     # ── Compute alert metrics ──────────────────────────────────────────────────
-    n_months   = max(df["admission_Date"].dt.to_period("M").nunique(), 1)
+    n_months   = max(month_count(df["admission_Date"]), 1)
     mo_adm     = len(df) / n_months
     cur_beds   = df["bed_No"].nunique()
     cur_nurses = len(nurses)
@@ -169,19 +165,19 @@ def run():
         </div>""", unsafe_allow_html=True)
 
     # ── Monthly summary ────────────────────────────────────────────────────────
-    df["Month"]           = df["admission_Date"].dt.to_period("M").astype(str)
-    df_completed["Month"] = df_completed["discharge_Date"].dt.to_period("M").astype(str)
-
-    monthly_admissions = df.groupby("Month")["admission_Id"].count().reset_index()
-    monthly_discharges = df_completed.groupby("Month")["admission_Id"].count().reset_index()
-    monthly_summary    = pd.merge(monthly_admissions, monthly_discharges, on="Month", how="outer",
-                                  suffixes=("_Admissions","_Discharges")).fillna(0).sort_values("Month")
-    avg_adm  = monthly_summary["admission_Id_Admissions"].mean()
-    last_mo  = monthly_summary["Month"].max()
-    last_val = monthly_summary.loc[monthly_summary["Month"] == last_mo, "admission_Id_Admissions"].values[0]
-    if last_val < avg_adm * 0.5:
-        monthly_summary = monthly_summary[monthly_summary["Month"] != last_mo]
-    monthly_summary['Month_Display'] = pd.to_datetime(monthly_summary['Month']).dt.strftime('%b %Y')
+    # valid_stay: the same rows _bed_stays keeps (negative stays dropped)
+    monthly_admissions = counts("admissions", "month", filters=F, valid_stay=True).rename("admission_Id_Admissions")
+    monthly_discharges = counts("discharges", "month", filters=F, valid_stay=True).rename("admission_Id_Discharges")
+    monthly_summary    = pd.concat([monthly_admissions, monthly_discharges], axis=1).fillna(0).sort_index()
+    monthly_summary['Month_Display'] = calendar(monthly_summary.index)["label"].to_numpy()
+    monthly_summary.index = monthly_summary.index.astype(str)
+    monthly_summary    = monthly_summary.rename_axis("Month").reset_index()
+    if len(monthly_summary) > 1:   # a single month is kept even when it is partial
+        avg_adm  = monthly_summary["admission_Id_Admissions"].mean()
+        last_mo  = monthly_summary["Month"].max()
+        last_val = monthly_summary.loc[monthly_summary["Month"] == last_mo, "admission_Id_Admissions"].values[0]
+        if last_val < avg_adm * 0.5:
+            monthly_summary = monthly_summary[monthly_summary["Month"] != last_mo]
 
     def spaced_ticks(labels, step=4):
         idx  = list(range(0, len(labels), step))
@@ -191,7 +187,7 @@ def run():
     # ── LOS Analysis ──────────────────────────────────────────────────────────
     st.markdown("<div class='section-header'>Length of Stay Analysis</div>", unsafe_allow_html=True)
 
-    los_df = df[df['discharge_Date'] < cutoff_date].copy()
+    los_df = df[df['discharge_Date'] < cutoff_date]
 
     fig1 = go.Figure()
     fig1.add_trace(go.Histogram(
@@ -238,7 +234,7 @@ def run():
     st.markdown("<div class='section-header'>Ward & Department Insights</div>", unsafe_allow_html=True)
 
     # Ward admissions
-    ward_adm = df.groupby('ward_Name')['admission_Id'].count().sort_values()
+    ward_adm = counts("admissions", "ward_Name", filters=F, valid_stay=True).sort_values()
     fig3 = go.Figure()
     fig3.add_trace(go.Bar(
         x=ward_adm.values, y=ward_adm.index, orientation='h',
@@ -258,7 +254,7 @@ def run():
 
     # Dept LOS deviation
     overall_avg = df["Length_of_Stay"].mean()
-    dept_los    = df.groupby('dept_Name')['Length_of_Stay'].mean()
+    dept_los    = df.groupby('dept_Name', observed=True)['Length_of_Stay'].mean()
     dept_diff   = (dept_los - overall_avg).sort_values()
     bar_colors  = [CORAL if x > 0 else PRIMARY_BLUE for x in dept_diff.values]
 
@@ -285,17 +281,14 @@ def run():
     # ── Patient Flow Trends ────────────────────────────────────────────────────
     st.markdown("<div class='section-header'>Patient Flow Trends</div>", unsafe_allow_html=True)
 
-    adm_trend = (df[df['admission_Date'] < cutoff_date]
-                 .groupby(df['admission_Date'].dt.to_period('M'))['patient_Id']
-                 .count().reset_index())
+    cutoff_month = cutoff_date.to_period('M')
+    adm_trend = counts("admissions", "month", filters=F, valid_stay=True, month=lambda m: m < cutoff_month).reset_index()
     adm_trend.columns = ['Month','Admissions']
-    adm_trend['Month_Display'] = adm_trend['Month'].dt.to_timestamp().dt.strftime('%b %Y')
+    adm_trend['Month_Display'] = calendar(adm_trend['Month'])['label'].to_numpy()
 
-    dis_trend = (df_completed[df_completed['discharge_Date'] < cutoff_date]
-                 .groupby(df_completed['discharge_Date'].dt.to_period('M'))['patient_Id']
-                 .count().reset_index())
+    dis_trend = counts("discharges", "month", filters=F, valid_stay=True, month=lambda m: m < cutoff_month).reset_index()
     dis_trend.columns = ['Month','Discharges']
-    dis_trend['Month_Display'] = dis_trend['Month'].dt.to_timestamp().dt.strftime('%b %Y')
+    dis_trend['Month_Display'] = calendar(dis_trend['Month'])['label'].to_numpy()
 
     tv5, tt5 = spaced_ticks(adm_trend['Month_Display'].tolist(), step=4)
     fig5 = go.Figure()
@@ -378,7 +371,7 @@ def run():
     # ── Monthly Summary Table ──────────────────────────────────────────────────
     st.markdown("<div class='section-header'>Monthly Summary</div>", unsafe_allow_html=True)
     display_summary = monthly_summary[['Month_Display','admission_Id_Admissions',
-                                        'admission_Id_Discharges','Monthly_BTR']].copy()
+                                        'admission_Id_Discharges','Monthly_BTR']]
     display_summary.columns = ['Month','Admissions','Discharges','Bed Turnover Rate']
     display_summary['Bed Turnover Rate'] = display_summary['Bed Turnover Rate'].round(2)
     st.dataframe(display_summary, use_container_width=True, hide_index=True)
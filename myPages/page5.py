@@ -2,6 +2,26 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from myPages.data import EXCEL_PATH, load_sheet, derived_table, calendar, lookup
+from myPages.filters import active_filters, filtered_tables, apply, counts
+from myPages.sqlstore import query, doctor_dept_counts, DOCTOR_WORKLOAD_SQL
+
+# ── Derived tables ─────────────────────────────────────────────────────────────
+@derived_table("Appointment", "Doctor", "Department", rows="Appointment", columns=("patient_Id", "doct_Id"))
+def _doctor_appointments(appointments, path=EXCEL_PATH):
+    # src_row is kept for the Global Filters
+    appointments = appointments.assign(dept_Name=lookup(appointments["doct_Id"], "doct_Id", "dept_Name", path),
+                                       FName=lookup(appointments["doct_Id"], "doct_Id", "FName", path))
+    appointments["Doctor_Name"] = appointments["FName"]
+    return appointments
+
+@derived_table("Nurse", "Department")
+def _nurse_count(path=EXCEL_PATH):
+    nurse       = load_sheet("Nurse", path, ("nurse_Id", "dept_Id"))
+    nurse_dept  = nurse.assign(dept_Name=lookup(nurse["dept_Id"], "dept_Id", "dept_Name", path))
+    nurse_count = nurse_dept.groupby("dept_Name", observed=True)["nurse_Id"].nunique().reset_index()
+    nurse_count.columns = ["dept_Name","nurse_Id"]
+    return nurse_count
 
 def run():
     dark_mode = st.session_state.get('dark_mode', False)
@@ -81,43 +101,23 @@ def run():
     st.markdown("<div class='page-title'>Staffing & Resource Optimization</div>", unsafe_allow_html=True)
     st.markdown("<div class='page-subtitle'>Strategic workforce analytics and resource allocation insights for optimal healthcare delivery</div>", unsafe_allow_html=True)
 
-    @st.cache_data
-    def load_data():
-        xls = pd.ExcelFile("data/dataFinal.xlsx")
-        return {sheet: pd.read_excel(xls, sheet) for sheet in xls.sheet_names}
-
-    tables = load_data()
-
-    patients     = tables["Patients"]
-    appointments = tables["Appointment"]
-    bed_records  = tables["BedRecords"]
-    doctor       = tables["Doctor"]
-    department   = tables["Department"]
-    nurse        = tables["Nurse"]
-
-    appointments["appointment_Date"] = pd.to_datetime(appointments["appointment_Date"])
-    bed_records["admission_Date"]    = pd.to_datetime(bed_records["admission_Date"])
-
-    doctor_dept  = doctor.merge(department, on="dept_Id", how="left")
-    appointments = appointments.merge(
-        doctor_dept[["doct_Id","dept_Name","FName"]], on="doct_Id", how="left"
-    )
-    appointments["Doctor_Name"] = appointments["FName"]
-    nurse_dept   = nurse.merge(department, on="dept_Id", how="left")
-    nurse_count  = nurse_dept.groupby("dept_Name")["nurse_Id"].nunique().reset_index()
-    nurse_count.columns = ["dept_Name","nurse_Id"]
-
-    # Use full unfiltered data — filters removed per user request
-    appointments_f = appointments.copy()
-    patients_f     = patients.copy()
-    bed_f          = bed_records.copy()
+    F = active_filters()
+    bed_records, nurse = filtered_tables(
+        "BedRecords", "Nurse",
+        columns={"BedRecords": ("patient_Id",),
+                 "Nurse":      ("nurse_Id", "dept_Id")}, filters=F)
+    appointments = apply(_doctor_appointments(), "Appointment", F, row_col="src_row")
+    nurse_count  = _nurse_count()
+    if appointments.empty and bed_records.empty:
+        st.info("No data for the selected filters")
+        return
 
     # ── KPIs ─────────────────────────────────────────────────────────────────
     col1, col2, col3 = st.columns(3)
     for col, lbl, val in [
-        (col1, "Active Doctors",   appointments_f["doct_Id"].nunique()),
+        (col1, "Active Doctors",   appointments["doct_Id"].nunique()),
         (col2, "Total Nurses",     nurse["nurse_Id"].nunique()),
-        (col3, "Departments",      appointments_f["dept_Name"].nunique()),
+        (col3, "Departments",      appointments["dept_Name"].nunique()),
     ]:
         col.markdown(f"""<div class="kpi-card">
             <div class="kpi-title">{lbl}</div>
@@ -176,7 +176,10 @@ def run():
     # ── Doctor Workload Heatmap ───────────────────────────────────────────────
     st.markdown("<div class='section-header'>Doctor Workload Heatmap (Top 10)</div>", unsafe_allow_html=True)
 
-    doctor_workload = appointments_f.groupby(["Doctor_Name","dept_Name"]).size().reset_index(name="Appointments")
+    doctor_workload = query(DOCTOR_WORKLOAD_SQL) if F is None else None
+    if doctor_workload is None:
+        doctor_workload = doctor_dept_counts(appointments["doct_Id"])
+    doctor_workload.columns = ["Doctor_Name","dept_Name","Appointments"]
     top10_doctors   = doctor_workload.groupby("Doctor_Name")["Appointments"].sum().sort_values(ascending=False).head(10).index
     heatmap_df      = doctor_workload[doctor_workload["Doctor_Name"].isin(top10_doctors)]
     pivot_heatmap   = heatmap_df.pivot(index="Doctor_Name", columns="dept_Name", values="Appointments").fillna(0)
@@ -213,9 +216,9 @@ def run():
     # ── Patient-to-Nurse Ratio ────────────────────────────────────────────────
     st.markdown("<div class='section-header'>Patient-to-Nurse Ratio</div>", unsafe_allow_html=True)
 
-    admissions_dept = bed_f.merge(
-        appointments_f[["patient_Id","dept_Name"]].drop_duplicates(), on="patient_Id", how="left"
-    ).groupby("dept_Name").size().reset_index(name="Total_Admissions")
+    admissions_dept = bed_records.merge(
+        appointments[["patient_Id","dept_Name"]].drop_duplicates(), on="patient_Id", how="left"
+    ).groupby("dept_Name", observed=True).size().reset_index(name="Total_Admissions")
 
     ratio_df = admissions_dept.merge(nurse_count, on="dept_Name", how="left")
     ratio_df["Patient_per_Nurse"] = (ratio_df["Total_Admissions"] / ratio_df["nurse_Id"].replace(0,1)).round(2)
@@ -290,8 +293,14 @@ def run():
     # ── Admissions Reference View ─────────────────────────────────────────────
     st.markdown("<div class='section-header'>Admissions Reference View for Staffing</div>", unsafe_allow_html=True)
 
-    monthly_admissions_view = bed_f.set_index("admission_Date").resample("M").size().reset_index(name="Admissions")
-    monthly_admissions_view['Month_Display'] = monthly_admissions_view['admission_Date'].dt.strftime('%b %Y')
+    adm_months = counts("admissions", "month", filters=F)
+    if adm_months.empty:
+        st.info("No data for the selected filters")
+        return
+    adm_months = adm_months.reindex(pd.period_range(adm_months.index.min(), adm_months.index.max(), freq="M"), fill_value=0)
+    monthly_admissions_view = pd.DataFrame({"admission_Date": adm_months.index.to_timestamp(how="end").normalize(),
+                                            "Admissions": adm_months.values,
+                                            "Month_Display": calendar(adm_months.index)["label"].to_numpy()})
 
     x_vals     = monthly_admissions_view['Month_Display'].tolist()
     show_every = max(1, len(x_vals) // 6)
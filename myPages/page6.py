@@ -2,45 +2,57 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import io
+import os
+import time
+import uuid
 import base64
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
+import pickle
+import hashlib
+import logging
+import threading
+import multiprocessing
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from myPages.data import (EXCEL_PATH, SNAPSHOT_DIR, sheet_names, data_version,
+                          derived_table, calendar, month_count, lookup)
+from myPages.filters import active_filters, filtered_tables, apply, counts
+from myPages.sqlstore import query, doctor_dept_counts, SURGEON_DEPT_SQL, DOCTOR_WORKLOAD_SQL
 
 # ── Data loader ────────────────────────────────────────────────────────────────
-@st.cache_data(show_spinner="Loading data...")
-def _load_p6():
-    xls     = pd.ExcelFile("data/dataFinal.xlsx")
-    patients= pd.read_excel(xls, "Patients")
-    appts   = pd.read_excel(xls, "Appointment")
-    bed_rec = pd.read_excel(xls, "BedRecords")
-    bed_df  = pd.read_excel(xls, "Bed")
-    ward_df = pd.read_excel(xls, "Ward")
-    surg    = pd.read_excel(xls, "SurgeryRecord")
-    doctors = pd.read_excel(xls, "Doctor")
-    depts   = pd.read_excel(xls, "Department")
-    nurses  = pd.read_excel(xls, "Nurse")
-
-    appts["appointment_Date"] = pd.to_datetime(appts["appointment_Date"],  errors="coerce")
-    bed_rec["admission_Date"] = pd.to_datetime(bed_rec["admission_Date"],  errors="coerce")
-    bed_rec["discharge_Date"] = pd.to_datetime(bed_rec["discharge_Date"],  errors="coerce")
-    surg["surgery_Date"]      = pd.to_datetime(surg["surgery_Date"],       errors="coerce")
-    bed_rec["LOS"]            = (bed_rec["discharge_Date"] - bed_rec["admission_Date"]).dt.days
-
-    bed_full = (bed_rec
-        .merge(bed_df,  on="bed_No",  how="left")
-        .merge(ward_df, on="ward_No", how="left")
-        .merge(depts,   on="dept_Id", how="left"))
-
+@derived_table("BedRecords", "Bed", "Ward", "Department", rows="BedRecords", show_spinner="Loading data...")
+def _bed_frames(bed_records, path=EXCEL_PATH):
+    bed_full = bed_records.assign(LOS=(bed_records["discharge_Date"] - bed_records["admission_Date"]).dt.days)
+    bed_full = bed_full.assign(ward_Name=lookup(bed_full["bed_No"], "bed_No", "ward_Name", path),
+                               dept_Name=lookup(bed_full["bed_No"], "bed_No", "dept_Name", path))
+    # src_row is kept on bed_full for the Global Filters
+    return bed_full.drop(columns=["src_row", "ward_Name", "dept_Name"]), bed_full
+
+def _load_p6(filters=None):
+    patients, appts, surg, doctors, depts, nurses = filtered_tables(
+        "Patients", "Appointment", "SurgeryRecord", "Doctor", "Department", "Nurse", filters=filters)
+    bed_rec, bed_full = _bed_frames()
+    bed_rec  = apply(bed_rec,  "BedRecords", filters)
+    bed_full = apply(bed_full, "BedRecords", filters, row_col="src_row")
     return patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses
 
 
 # ── Matplotlib chart helpers ───────────────────────────────────────────────────
 PALETTE = ["#1E40AF","#3B82F6","#059669","#DC2626","#D97706","#7C3AED","#0D9488","#64748B"]
 
+def _subplots(figsize):
+    # matplotlib is only needed for the PDF report; importing it here keeps it
+    # (and its font cache) off the page's first render. Charts are plain Figure
+    # objects on their own Agg canvas, not pyplot figures: pyplot's global figure
+    # state is not thread-safe, and reports render on several threads at once.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize, facecolor="white")
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
 def _fig_to_bytes(fig, dpi=150):
     buf = io.BytesIO()
     fig.patch.set_facecolor('white')
@@ -52,7 +64,7 @@ def _fig_to_bytes(fig, dpi=150):
     return buf.read()
 
 def _make_bar_h(labels, values, title, color="#1E40AF", figsize=(9,4)):
-    fig, ax = plt.subplots(figsize=figsize, facecolor="white")
+    fig, ax = _subplots(figsize)
     y   = range(len(labels))
     bars= ax.barh(y, values, color=color, height=0.6)
     ax.set_yticks(list(y)); ax.set_yticklabels(labels, fontsize=9)
@@ -66,7 +78,7 @@ def _make_bar_h(labels, values, title, color="#1E40AF", figsize=(9,4)):
     fig.tight_layout(); return fig
 
 def _make_bar_v(labels, values, title, colors_list=None, figsize=(9,4)):
-    fig, ax = plt.subplots(figsize=figsize, facecolor="white")
+    fig, ax = _subplots(figsize)
     c = colors_list or PALETTE[:len(labels)]
     ax.bar(range(len(labels)), values, color=c[:len(labels)], width=0.6)
     ax.set_xticks(range(len(labels)))
@@ -76,7 +88,7 @@ def _make_bar_v(labels, values, title, colors_list=None, figsize=(9,4)):
     fig.tight_layout(); return fig
 
 def _make_line(x, ys, labels, title, colors_list=None, figsize=(9,4)):
-    fig, ax = plt.subplots(figsize=figsize, facecolor="white")
+    fig, ax = _subplots(figsize)
     c = colors_list or PALETTE
     for i, (y, lbl) in enumerate(zip(ys, labels)):
         ax.plot(x, y, marker="o", markersize=4, linewidth=2, color=c[i % len(c)], label=lbl)
@@ -88,7 +100,7 @@ def _make_line(x, ys, labels, title, colors_list=None, figsize=(9,4)):
     fig.tight_layout(); return fig
 
 def _make_pie(labels, values, title, figsize=(7,5)):
-    fig, ax = plt.subplots(figsize=figsize, facecolor="white")
+    fig, ax = _subplots(figsize)
     wedges, texts, autotexts = ax.pie(
         values, labels=labels, autopct="%1.1f%%", colors=PALETTE[:len(labels)],
         startangle=140, pctdistance=0.75, wedgeprops=dict(width=0.55))
@@ -98,7 +110,7 @@ def _make_pie(labels, values, title, figsize=(7,5)):
     fig.tight_layout(); return fig
 
 def _make_heatmap(data_2d, row_labels, col_labels, title, figsize=(11,5)):
-    fig, ax = plt.subplots(figsize=figsize, facecolor="white")
+    fig, ax = _subplots(figsize)
     im = ax.imshow(data_2d, cmap="Reds", aspect="auto")
     ax.set_xticks(range(len(col_labels))); ax.set_xticklabels(col_labels, rotation=45, ha="right", fontsize=7)
     ax.set_yticks(range(len(row_labels))); ax.set_yticklabels(row_labels, fontsize=8)
@@ -108,10 +120,10 @@ def _make_heatmap(data_2d, row_labels, col_labels, title, figsize=(11,5)):
             v = data_2d[i,j]
             ax.text(j, i, str(int(v)), ha="center", va="center", fontsize=7,
                     color="white" if v > data_2d.max()*0.5 else "black")
-    plt.colorbar(im, ax=ax, shrink=0.8); fig.tight_layout(); return fig
+    fig.colorbar(im, ax=ax, shrink=0.8); fig.tight_layout(); return fig
 
 def _make_grouped_bar(categories, groups, values_dict, title, figsize=(9,4)):
-    fig, ax = plt.subplots(figsize=figsize, facecolor="white")
+    fig, ax = _subplots(figsize)
     x = np.arange(len(categories)); w = 0.8 / len(groups)
     for i, grp in enumerate(groups):
         ax.bar(x + i*w - 0.4 + w/2, values_dict[grp], width=w, label=grp, color=PALETTE[i % len(PALETTE)])
@@ -122,32 +134,32 @@ def _make_grouped_bar(categories, groups, values_dict, title, figsize=(9,4)):
 
 
 # ── Build chart by ID ─────────────────────────────────────────────────────────
-def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses):
+def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses, filters=None):
     MONTH_ORDER = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
 
     if chart_id == "p1_patient_flow":
-        flow_apps = appts.dropna(subset=["appointment_Date"]).groupby(appts["appointment_Date"].dt.to_period("M")).size()
-        flow_adm  = bed_rec.dropna(subset=["admission_Date"]).groupby(bed_rec["admission_Date"].dt.to_period("M")).size()
+        flow_apps = counts("appointments", "month", filters=filters)
+        flow_adm  = counts("admissions", "month", filters=filters)
         df = pd.concat([flow_apps.rename("Appointments"), flow_adm.rename("Admissions")], axis=1).fillna(0)
-        df.index = df.index.to_timestamp().strftime("%b %Y")
+        df.index = calendar(df.index)["label"].to_numpy()
         fig = _make_line(list(df.index), [df["Appointments"].tolist(), df["Admissions"].tolist()],
                          ["Appointments","Admissions"], "Patient Flow Trends", [PALETTE[0], PALETTE[3]])
         return "Patient Flow Trends", fig, None
 
     if chart_id == "p1_outcomes":
-        s   = appts["appointment_status"].value_counts()
+        s   = counts("appointments", "appointment_status", filters=filters).sort_values(ascending=False)
         fig = _make_pie(s.index.tolist(), s.values.tolist(), "Appointment Outcomes")
         return "Appointment Outcomes", fig, None
 
     if chart_id == "p1_dept_demand":
-        dept_flow = bed_full.groupby("dept_Name").size().reset_index(name="Admissions").sort_values("Admissions")
+        dept_flow = counts("admissions", "dept_Name", filters=filters).reset_index(name="Admissions").sort_values("Admissions")
         fig = _make_bar_h(dept_flow["dept_Name"].tolist(), dept_flow["Admissions"].tolist(), "Department Demand")
         return "Department Demand", fig, None
 
     if chart_id == "p1_peak_months":
-        appts["month_name"] = appts["appointment_Date"].dt.strftime("%b")
-        appts["year"]       = appts["appointment_Date"].dt.year
-        mc    = appts.groupby(["year","month_name"]).size().reset_index(name="Count")
+        m     = counts("appointments", "month", filters=filters)
+        cal   = calendar(m.index)
+        mc    = pd.DataFrame({"year": cal["year"].to_numpy(), "month_name": cal["month_name"].to_numpy(), "Count": m.values})
         years = sorted(mc["year"].dropna().unique())
         groups= {str(y): [] for y in years}
         for mo in MONTH_ORDER:
@@ -158,12 +170,11 @@ def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, dep
         return "Peak Appointment Months", fig, None
 
     if chart_id == "p1_completion":
-        monthly_total = appts.groupby(appts["appointment_Date"].dt.to_period("M")).size()
-        monthly_comp  = appts[appts["appointment_status"].astype(str).str.lower()=="completed"]\
-                            .groupby(appts["appointment_Date"].dt.to_period("M")).size()
+        monthly_total = counts("appointments", "month", filters=filters)
+        monthly_comp  = counts("appointments", "month", filters=filters, appointment_status=lambda s: s.str.lower() == "completed")
         rate = (monthly_comp / monthly_total * 100).fillna(0).reset_index()
         rate.columns = ["Month","Rate"]
-        rate["Month"] = rate["Month"].dt.to_timestamp().dt.strftime("%b %Y")
+        rate["Month"] = calendar(rate["Month"])["label"].to_numpy()
         fig = _make_line(rate["Month"].tolist(), [rate["Rate"].tolist()],
                          ["Completion Rate %"], "Appointment Completion Rate", [PALETTE[2]])
         return "Appointment Completion Rate", fig, None
@@ -203,10 +214,8 @@ def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, dep
         return "Payment Methods", fig, None
 
     if chart_id == "p2_appt_trend":
-        appts["year"]  = appts["appointment_Date"].dt.year
-        appts["month"] = appts["appointment_Date"].dt.month
-        appts["month_name"] = appts["appointment_Date"].dt.strftime("%b")
-        mc    = appts.groupby(["year","month","month_name"]).size().reset_index(name="Count")
+        m     = counts("appointments", "month", filters=filters)
+        mc    = pd.DataFrame({"year": m.index.year, "month": m.index.month, "Count": m.values})
         years = sorted(mc["year"].dropna().unique())[-2:]
         ys, lbls = [], []
         for y in years:
@@ -216,28 +225,25 @@ def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, dep
         return "Appointment Trend 2024 vs 2025", fig, None
 
     if chart_id == "p3_top_surgeries":
-        top = surg["surgery_Type"].value_counts().head(10)
+        top = counts("surgeries", "surgery_Type", filters=filters).sort_values(ascending=False).head(10)
         fig = _make_bar_h(top.index.tolist(), top.values.tolist(), "Top 10 Most Common Surgical Procedures", color=PALETTE[5])
         return "Top 10 Surgical Procedures", fig, None
 
     if chart_id == "p3_surgery_trend":
-        surg["month"] = surg["surgery_Date"].dt.to_period("M")
-        st_trend = surg.groupby("month").size().reset_index(name="Count")
-        st_trend["month"] = st_trend["month"].dt.to_timestamp().dt.strftime("%b %Y")
+        st_trend = counts("surgeries", "month", filters=filters).reset_index(name="Count")
+        st_trend["month"] = calendar(st_trend["month"])["label"].to_numpy()
         fig = _make_line(st_trend["month"].tolist(), [st_trend["Count"].tolist()], ["Surgeries"], "Surgery Trend Over Time", [PALETTE[5]])
         return "Surgery Trend Over Time", fig, None
 
     if chart_id == "p3_surgery_dept":
-        sc = surg.merge(doctors[["doct_Id","dept_Id"]], left_on="surgeon_Id", right_on="doct_Id", how="left")\
-                 .merge(depts[["dept_Id","dept_Name"]], on="dept_Id", how="left")
-        sc = sc.groupby("dept_Name").size().reset_index(name="Count").sort_values("Count")
+        sc = counts("surgeries", "dept_Name", filters=filters).reset_index(name="Count").sort_values("Count")
         fig = _make_bar_h(sc["dept_Name"].tolist(), sc["Count"].tolist(), "Surgery Distribution by Department", color=PALETTE[2])
         return "Surgery Distribution by Department", fig, None
 
     if chart_id == "p3_heatmap":
-        doc_dept = doctors.merge(depts, on="dept_Id", how="left")[["doct_Id","FName","dept_Name"]]
-        hd = surg.merge(doc_dept, left_on="surgeon_Id", right_on="doct_Id", how="inner").dropna(subset=["FName","dept_Name"])
-        hc = hd.groupby(["FName","dept_Name"]).size().reset_index(name="Count")
+        hc = query(SURGEON_DEPT_SQL) if filters is None else None
+        if hc is None:
+            hc = doctor_dept_counts(surg["surgeon_Id"])
         top10 = hc.groupby("FName")["Count"].sum().nlargest(10).index
         hc  = hc[hc["FName"].isin(top10)]
         piv = hc.pivot(index="FName", columns="dept_Name", values="Count").fillna(0)
@@ -246,37 +252,38 @@ def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, dep
 
     if chart_id == "p4_los":
         if "dept_Name" in bed_full.columns and "LOS" in bed_full.columns:
-            los = bed_full.groupby("dept_Name")["LOS"].mean().dropna().sort_values()
+            los = bed_full.groupby("dept_Name", observed=True)["LOS"].mean().dropna().sort_values()
             fig = _make_bar_h(los.index.tolist(), los.values.round(1).tolist(), "Average Length of Stay by Department")
         else: fig = None
         return "Avg LOS by Department", fig, None
 
     if chart_id == "p4_ward":
         if "ward_Name" in bed_full.columns:
-            w   = bed_full.groupby("ward_Name")["admission_Id"].count().sort_values()
+            # rows without an admission_Id are not counted (the cube counts every row)
+            w   = bed_full.groupby("ward_Name", observed=True)["admission_Id"].count().sort_values()
             fig = _make_bar_h(w.index.tolist(), w.values.tolist(), "Ward Utilization Overview", color=PALETTE[1])
         else: fig = None
         return "Ward Utilization", fig, None
 
     if chart_id == "p4_flow":
-        adm_t = bed_rec.dropna(subset=["admission_Date"]).groupby(bed_rec["admission_Date"].dt.to_period("M")).size()
-        dis_t = bed_rec.dropna(subset=["discharge_Date"]).groupby(bed_rec["discharge_Date"].dt.to_period("M")).size()
+        adm_t = counts("admissions", "month", filters=filters)
+        dis_t = counts("discharges", "month", filters=filters)
         df = pd.concat([adm_t.rename("Admissions"), dis_t.rename("Discharges")], axis=1).fillna(0)
-        df.index = df.index.to_timestamp().strftime("%b %Y")
+        df.index = calendar(df.index)["label"].to_numpy()
         fig = _make_line(list(df.index), [df["Admissions"].tolist(), df["Discharges"].tolist()],
                          ["Admissions","Discharges"], "Patient Flow — Admissions vs Discharges", [PALETTE[0], PALETTE[2]])
         return "Admissions vs Discharges", fig, None
 
     if chart_id == "p5_nurse_dist":
-        nurse_dept = nurses.merge(depts, on="dept_Id", how="left")
-        nd  = nurse_dept.groupby("dept_Name")["nurse_Id"].nunique().sort_values()
+        nurse_dept = nurses.assign(dept_Name=lookup(nurses["dept_Id"], "dept_Id", "dept_Name"))
+        nd  = nurse_dept.groupby("dept_Name", observed=True)["nurse_Id"].nunique().sort_values()
         fig = _make_bar_h(nd.index.tolist(), nd.values.tolist(), "Nurse Distribution by Department", color=PALETTE[4])
         return "Nurse Distribution by Department", fig, None
 
     if chart_id == "p5_heatmap":
-        doc_dept = doctors.merge(depts, on="dept_Id", how="left")[["doct_Id","FName","dept_Name"]]
-        merged   = appts.merge(doc_dept, on="doct_Id", how="left").dropna(subset=["FName","dept_Name"])
-        hc       = merged.groupby(["FName","dept_Name"]).size().reset_index(name="Count")
+        hc       = query(DOCTOR_WORKLOAD_SQL) if filters is None else None
+        if hc is None:
+            hc   = doctor_dept_counts(appts["doct_Id"])
         top10    = hc.groupby("FName")["Count"].sum().nlargest(10).index
         hc       = hc[hc["FName"].isin(top10)]
         piv      = hc.pivot(index="FName", columns="dept_Name", values="Count").fillna(0)
@@ -284,10 +291,10 @@ def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, dep
         return "Doctor Workload Heatmap", fig, None
 
     if chart_id == "p5_pt_nurse_ratio":
-        nurse_dept = nurses.merge(depts, on="dept_Id", how="left")\
-                           .groupby("dept_Name")["nurse_Id"].nunique().reset_index(name="Nurses")
+        nurse_dept = nurses.assign(dept_Name=lookup(nurses["dept_Id"], "dept_Id", "dept_Name"))\
+                           .groupby("dept_Name", observed=True)["nurse_Id"].nunique().reset_index(name="Nurses")
         if "dept_Name" in bed_full.columns:
-            pt_dept  = bed_full.groupby("dept_Name")["patient_Id"].nunique().reset_index(name="Patients")
+            pt_dept  = bed_full.groupby("dept_Name", observed=True)["patient_Id"].nunique().reset_index(name="Patients")
             ratio_df = pt_dept.merge(nurse_dept, on="dept_Name", how="inner")
             ratio_df["Ratio"] = (ratio_df["Patients"] / ratio_df["Nurses"].replace(0,1)).round(1)
             ratio_df = ratio_df.sort_values("Ratio")
@@ -297,7 +304,7 @@ def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, dep
         return "Patient-to-Nurse Ratio", fig, None
 
     if chart_id == "p6_capacity_proj":
-        n_months = max(bed_rec["admission_Date"].dt.to_period("M").nunique(), 1)
+        n_months = max(month_count(bed_rec["admission_Date"]), 1)
         mo_adm   = len(bed_rec) / n_months
         cur_beds = bed_rec["bed_No"].nunique()
         avg_los  = bed_rec["LOS"].dropna().mean() or 5
@@ -305,7 +312,7 @@ def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, dep
         mx       = list(range(1, hor+1))
         pvol     = [mo_adm * (1 + (gr/100) * (m/hor)) for m in mx]
         pbeds    = [(v * avg_los) / (30 * 0.80) for v in pvol]
-        fig, ax1 = plt.subplots(figsize=(9,4), facecolor="white")
+        fig, ax1 = _subplots((9,4))
         ax2 = ax1.twinx()
         ax1.plot(mx, pvol,  "o-", color=PALETTE[0], linewidth=2, markersize=5, label="Projected Admissions")
         ax1.axhline(mo_adm, color=PALETTE[3], linewidth=2, linestyle="--", label="Current Baseline")
@@ -324,10 +331,204 @@ def build_chart(chart_id, patients, appts, bed_rec, bed_full, surg, doctors, dep
     return chart_id, None, None
 
 
+# ── Parallel chart rendering ───────────────────────────────────────────────────
+# Rendering the PDF charts is CPU-bound matplotlib work, so a report spreads it
+# over a pool of worker processes. A task is just a chart ID and the Global
+# Filters: each worker loads the frames through its own caches (the snapshot
+# files are memory-mapped, so this is cheap after the first chart) and sends
+# back PNG bytes. A worker holds its own copy of the frames, so the pool is
+# small (at most 4 by default; DASHBOARD_PDF_WORKERS overrides it), started when
+# a report needs it and shut down after PDF_POOL_IDLE seconds without one. With
+# one worker, or if the pool breaks, the charts render in this process.
+PDF_WORKERS   = int(os.environ.get("DASHBOARD_PDF_WORKERS", "0") or 0) or min(4, os.cpu_count() or 1)
+PDF_POOL_IDLE = 60
+
+def _quiet_worker():
+    from streamlit.logger import set_log_level
+    set_log_level("error")   # no "missing ScriptRunContext" warnings from bare-mode caches
+
+class ChartPool:
+    def __init__(self, workers=PDF_WORKERS, idle=PDF_POOL_IDLE):
+        self.workers = workers
+        self.idle    = idle
+        self.pool    = None
+        self.users   = 0
+        self.timer   = None
+        self.lock    = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()   # a pending idle shutdown no longer applies
+                self.timer = None
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_quiet_worker,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            self.users += 1
+            return self.pool
+
+    def release(self):
+        with self.lock:
+            self.users -= 1
+            if self.users == 0 and self.pool is not None:
+                self.timer = threading.Timer(self.idle, self._shutdown_idle)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def discard(self, pool):
+        # a broken pool is dropped at once; the next report starts a fresh one
+        with self.lock:
+            if self.pool is pool:
+                self.pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _shutdown_idle(self):
+        with self.lock:
+            if self.timer is not threading.current_thread() or self.users:
+                return
+            pool, self.pool, self.timer = self.pool, None, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+@st.cache_resource
+def _chart_pool():
+    return ChartPool()
+
+def _chart_png(chart_id, frames, filters=None):
+    ch_title, fig, _ = build_chart(chart_id, *frames, filters)
+    if fig is None:
+        return ch_title, None
+    png = _fig_to_bytes(fig, dpi=CHART_DPI)
+    return ch_title, png
+
+def _render_chart(chart_id, filters=None):
+    # runs in a pool worker
+    return _chart_png(chart_id, _load_p6(filters), filters)
+
+def _render(chart_ids, frames, filters=None):
+    # yields (title, png) per chart in order, as each one finishes
+    done = 0
+    if PDF_WORKERS > 1 and len(chart_ids) > 1:
+        pools = _chart_pool()
+        pool  = pools.acquire()
+        try:
+            for item in pool.map(_render_chart, chart_ids, [filters] * len(chart_ids)):
+                yield item
+                done += 1
+            return
+        except (BrokenProcessPool, OSError, pickle.PicklingError):
+            pools.discard(pool)
+        finally:
+            pools.release()
+    for cid in chart_ids[done:]:
+        yield _chart_png(cid, frames, filters)
+
+
+# ── Chart image cache ──────────────────────────────────────────────────────────
+# Rendered charts are content-addressed: the key hashes the chart ID, the data
+# version of every sheet, the Global Filters and the dpi, so an unchanged chart
+# is rendered once. A per-process LRU bounded in bytes sits in front of a disk
+# tier next to the data snapshot, which other worker processes and later reports
+# reuse; the disk tier keeps the most recently used files. An entry is the title
+# line followed by the PNG bytes.
+CHART_DPI          = 150
+CHART_CACHE_FORMAT = 1
+CHART_CACHE_DIR    = os.path.join(SNAPSHOT_DIR, "charts")
+CHART_CACHE_BYTES  = 64 << 20
+CHART_CACHE_FILES  = 1024
+
+def chart_key(chart_id, version, filters=None, dpi=CHART_DPI):
+    raw = repr((CHART_CACHE_FORMAT, chart_id, version, filters, dpi))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class PngCache:
+    def __init__(self, directory=CHART_CACHE_DIR, max_bytes=CHART_CACHE_BYTES, max_files=CHART_CACHE_FILES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.items     = OrderedDict()   # key → (title, png), least recently used first
+        self.size      = 0
+        self.lock      = threading.Lock()
+
+    def _file(self, key):
+        return os.path.join(self.directory, f"{key}.chart")
+
+    def _remember(self, key, item):
+        with self.lock:
+            if key in self.items:
+                self.size -= len(self.items.pop(key)[1])
+            self.items[key] = item
+            self.size      += len(item[1])
+            while self.size > self.max_bytes and len(self.items) > 1:
+                self.size -= len(self.items.popitem(last=False)[1][1])
+
+    def get(self, key):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+        try:
+            with open(self._file(key), "rb") as f:
+                title, _, png = f.read().partition(b"\n")
+            os.utime(self._file(key))   # mtime is the disk tier's recency
+        except OSError:
+            return None
+        item = (title.decode(), png)
+        self._remember(key, item)
+        return item
+
+    def put(self, key, item):
+        self._remember(key, item)
+        tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(item[0].encode() + b"\n" + item[1])
+            os.replace(tmp, self._file(key))
+            self._prune()
+        except OSError:
+            pass
+
+    def _prune(self):
+        files = [e for e in os.scandir(self.directory) if e.name.endswith(".chart")]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for e in files[:len(files) - self.max_files]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+@st.cache_resource
+def _png_cache():
+    return PngCache()
+
+def render_charts(chart_ids, frames, filters=None, path=EXCEL_PATH, progress=None):
+    """(title, PNG bytes or None) for each chart ID, in order; only charts not in
+    the cache are rendered. `progress(done, total)` is called as charts complete."""
+    cache   = _png_cache()
+    version = data_version(*sheet_names(path), path=path)
+    keys    = [chart_key(cid, version, filters) for cid in chart_ids]
+    out     = [cache.get(k) for k in keys]
+    missing = [i for i, item in enumerate(out) if item is None]
+    done    = len(chart_ids) - len(missing)
+    if progress:
+        progress(done, len(chart_ids))
+    for i, item in zip(missing, _render([chart_ids[i] for i in missing], frames, filters)):
+        out[i] = item
+        if item[1] is not None:
+            cache.put(keys[i], item)
+        done += 1
+        if progress:
+            progress(done, len(chart_ids))
+    return out
+
+
 # ── PDF builder ────────────────────────────────────────────────────────────────
 def build_pdf(selected_chart_ids, r_title, r_author, r_dept, r_notes,
               kpi_data, alert_data,
-              patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses):
+              patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses, filters=None, progress=None):
 
     try:
         from reportlab.lib.pagesizes import A4
@@ -524,10 +725,9 @@ def build_pdf(selected_chart_ids, r_title, r_author, r_dept, r_notes,
         story.append(PageBreak())
         story.append(section_heading("Dashboard Visualizations"))
         story.append(Spacer(1, 0.4*cm))
-        for idx_c, cid in enumerate(selected_chart_ids):
-            ch_title, fig, _ = build_chart(cid, patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses)
-            if fig is None: continue
-            png = _fig_to_bytes(fig, dpi=150); plt.close(fig)
+        frames = (patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses)
+        for idx_c, (ch_title, png) in enumerate(render_charts(selected_chart_ids, frames, filters, progress=progress)):
+            if png is None: continue
             img_w = body_w; img_h = round(img_w * 7 / 16, 2)
             img_obj = Image(io.BytesIO(png), width=img_w, height=img_h)
             chart_block = [
@@ -557,6 +757,99 @@ def build_pdf(selected_chart_ids, r_title, r_author, r_dept, r_notes,
     buf.seek(0); return buf.read()
 
 
+# ── Background report jobs ─────────────────────────────────────────────────────
+# "Generate PDF Report" queues a job instead of building the PDF inside the
+# session's rerun. One queue serves every session of the server process: at most
+# REPORT_WORKERS reports build at once (their charts still go through the chart
+# pool and cache) and later ones wait their turn. A session keeps only its job
+# ID, and its previous finished job is dropped when it queues the next one.
+# Finished jobs hold their PDF until REPORT_JOB_TTL seconds after they complete,
+# and only the REPORT_JOBS_MAX most recent are kept, however many sessions left
+# theirs behind.
+REPORT_WORKERS  = int(os.environ.get("DASHBOARD_REPORT_WORKERS", "0") or 0) or 2
+REPORT_JOB_TTL  = 3600
+REPORT_JOBS_MAX = 16
+
+class _ReportThreadFilter(logging.Filter):
+    # report threads call the cached data functions outside any script run, which
+    # is expected there: drop the "missing ScriptRunContext" warning for them
+    def filter(self, record):
+        return not threading.current_thread().name.startswith("pdf-report")
+
+class ReportJob:
+    def __init__(self, total):
+        self.status   = "queued"   # queued → running → done | failed
+        self.done     = 0          # charts rendered so far
+        self.total    = total
+        self.pdf      = None
+        self.error    = None
+        self.finished = None
+
+    @property
+    def pending(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def file_name(self):
+        return f"Hospital_Report_{datetime.fromtimestamp(self.finished).strftime('%Y%m%d_%H%M')}.pdf"
+
+class ReportQueue:
+    def __init__(self, workers=REPORT_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-report")
+        self.jobs     = {}
+        self.lock     = threading.Lock()
+
+    def submit(self, selected_chart_ids, *args, replaces=None, **kwargs):
+        """Queue build_pdf(selected_chart_ids, *args, **kwargs); returns the job ID.
+        `replaces` is the session's previous job, dropped here if it has finished."""
+        job_id, job = uuid.uuid4().hex, ReportJob(len(selected_chart_ids))
+        with self.lock:
+            if replaces in self.jobs and not self.jobs[replaces].pending:
+                del self.jobs[replaces]
+            self.jobs[job_id] = job
+            self._prune()
+        self.executor.submit(self._run, job, (selected_chart_ids, *args), kwargs)
+        return job_id
+
+    def _prune(self):
+        # caller holds self.lock; pending jobs are never dropped
+        now      = time.time()
+        finished = sorted((j.finished, k) for k, j in self.jobs.items() if j.finished)
+        for i, (at, k) in enumerate(finished):
+            if now - at > REPORT_JOB_TTL or i < len(finished) - REPORT_JOBS_MAX:
+                del self.jobs[k]
+
+    def _run(self, job, args, kwargs):
+        job.status = "running"
+        try:
+            pdf = build_pdf(*args, progress=lambda done, total: setattr(job, "done", done), **kwargs)
+            job.pdf, job.finished, job.status = pdf, time.time(), "done"
+        except Exception as e:
+            job.error, job.finished, job.status = str(e), time.time(), "failed"
+        with self.lock:
+            self._prune()
+
+    def get(self, job_id):
+        with self.lock:
+            self._prune()
+            return self.jobs.get(job_id)
+
+    def ahead(self, job_id):
+        """Number of queued jobs submitted before `job_id`."""
+        with self.lock:
+            ahead = 0
+            for k, j in self.jobs.items():   # in submission order
+                if k == job_id:
+                    return ahead
+                ahead += j.status == "queued"
+            raise KeyError(job_id)
+
+@st.cache_resource
+def _report_queue():
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(_ReportThreadFilter())
+    return ReportQueue()
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 # MAIN PAGE
 # ══════════════════════════════════════════════════════════════════════════════
@@ -670,10 +963,11 @@ def run():
     st.markdown("<div class='pg-title'>Intelligence & Capacity Planning</div>", unsafe_allow_html=True)
     st.markdown("<div class='pg-sub'>Capacity Planning Simulator  |  PDF Report Builder  |  Strategic Resource Forecasting</div>", unsafe_allow_html=True)
 
-    patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses = _load_p6()
+    F = active_filters()
+    patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses = _load_p6(F)
 
     # Shared metrics
-    n_months    = max(bed_rec["admission_Date"].dt.to_period("M").nunique(), 1)
+    n_months    = max(month_count(bed_rec["admission_Date"]), 1)
     mo_adm      = round(len(bed_rec) / n_months, 1)
     cur_beds    = bed_rec["bed_No"].nunique()
     cur_nurses  = len(nurses)
@@ -688,42 +982,45 @@ def run():
     # ═══════════════════════════════════════════════════════════════════════
     # SECTION 1 — CAPACITY PLANNING SIMULATOR
     # ═══════════════════════════════════════════════════════════════════════
-    st.markdown("<div class='sec-hdr'>Capacity Planning Simulator</div>", unsafe_allow_html=True)
-    st.caption("Adjust the sliders to model future resource requirements based on growth projections.")
-
-    sc1, sc2 = st.columns([1, 1], gap="large")
-    with sc1:
-        st.markdown(f"<div style='color:{text_color};font-size:17px;font-weight:800;margin-bottom:10px;'>Current Baseline</div>", unsafe_allow_html=True)
-        for lbl, val in [
-            ("Monthly admissions", f"{int(mo_adm):,}"),
-            ("Total beds", f"{cur_beds:,}"),
-            ("Nurses", f"{cur_nurses:,}"),
-            ("Doctors", f"{cur_docs:,}"),
-            ("Average LOS (days)", str(avg_los)),
-        ]:
-            st.markdown(f"<div style='color:{sec_text};font-size:16px;padding:4px 0;'>• {lbl}: <b style='color:{text_color}'>{val}</b></div>", unsafe_allow_html=True)
-        st.markdown("---")
-        gr  = st.slider("Expected volume growth (%)",   0, 100, 20, 5, key="sim_gr")
-        lsc = st.slider("Change in average LOS (%)", -50,  50,  0, 5, key="sim_los")
-        hor = st.select_slider("Planning horizon (months)", options=[3,6,12,24,36], value=12, key="sim_hor")
-        occ = st.slider("Target bed occupancy (%)",  50,  95, 80, 5, key="sim_occ")
-
-    with sc2:
-        p_adm  = mo_adm * (1 + gr/100)
-        p_los  = avg_los * (1 + lsc/100)
-        p_beds = (p_adm * p_los) / (30 * (occ/100))
-        p_nur  = p_adm * nur_ratio * (1 + gr/100)
-        p_doc  = p_adm * doc_ratio * (1 + gr/100)
-        bg, ng, dg = int(p_beds - cur_beds), int(p_nur - cur_nurses), int(p_doc - cur_docs)
-        rev_leak   = round(cancel_r/100 * p_adm * 12 * 5000, 0)
-
-        def gc(v):
-            if v <= 0:   return "g-ok",   f"Surplus of {abs(v)}"
-            elif v < 10: return "g-warn",  f"Need +{v}"
-            else:        return "g-crit",  f"Critical gap: +{v}"
-
-        bc, bt = gc(bg); nc, nt = gc(ng); dc, dt = gc(dg)
-        st.markdown(f"""<div class="sim-box">
+    # Fragment: a slider change reruns only the simulator panel
+    @st.fragment
+    def capacity_simulator():
+        st.markdown("<div class='sec-hdr'>Capacity Planning Simulator</div>", unsafe_allow_html=True)
+        st.caption("Adjust the sliders to model future resource requirements based on growth projections.")
+
+        sc1, sc2 = st.columns([1, 1], gap="large")
+        with sc1:
+            st.markdown(f"<div style='color:{text_color};font-size:17px;font-weight:800;margin-bottom:10px;'>Current Baseline</div>", unsafe_allow_html=True)
+            for lbl, val in [
+                ("Monthly admissions", f"{int(mo_adm):,}"),
+                ("Total beds", f"{cur_beds:,}"),
+                ("Nurses", f"{cur_nurses:,}"),
+                ("Doctors", f"{cur_docs:,}"),
+                ("Average LOS (days)", str(avg_los)),
+            ]:
+                st.markdown(f"<div style='color:{sec_text};font-size:16px;padding:4px 0;'>• {lbl}: <b style='color:{text_color}'>{val}</b></div>", unsafe_allow_html=True)
+            st.markdown("---")
+            gr  = st.slider("Expected volume growth (%)",   0, 100, 20, 5, key="sim_gr")
+            lsc = st.slider("Change in average LOS (%)", -50,  50,  0, 5, key="sim_los")
+            hor = st.select_slider("Planning horizon (months)", options=[3,6,12,24,36], value=12, key="sim_hor")
+            occ = st.slider("Target bed occupancy (%)",  50,  95, 80, 5, key="sim_occ")
+
+        with sc2:
+            p_adm  = mo_adm * (1 + gr/100)
+            p_los  = avg_los * (1 + lsc/100)
+            p_beds = (p_adm * p_los) / (30 * (occ/100))
+            p_nur  = p_adm * nur_ratio * (1 + gr/100)
+            p_doc  = p_adm * doc_ratio * (1 + gr/100)
+            bg, ng, dg = int(p_beds - cur_beds), int(p_nur - cur_nurses), int(p_doc - cur_docs)
+            rev_leak   = round(cancel_r/100 * p_adm * 12 * 5000, 0)
+
+            def gc(v):
+                if v <= 0:   return "g-ok",   f"Surplus of {abs(v)}"
+                elif v < 10: return "g-warn",  f"Need +{v}"
+                else:        return "g-crit",  f"Critical gap: +{v}"
+
+            bc, bt = gc(bg); nc, nt = gc(ng); dc, dt = gc(dg)
+            st.markdown(f"""<div class="sim-box">
           <div class="sim-ttl">Projected needs at +{gr}% growth over {hor} months</div>
           <div class="g-row"><span>Monthly admissions</span><b>{int(p_adm):,}</b></div>
           <div class="g-row"><span>Average LOS</span><b>{p_los:.1f} days</b></div>
@@ -737,122 +1034,126 @@ def run():
             <b style="color:{CR}">Rs {rev_leak:,.0f}</b></div>
         </div>""", unsafe_allow_html=True)
 
-    # Capacity projection chart
-    mx           = list(range(1, hor+1))
-    pvol         = [mo_adm*(1+(gr/100)*(m/hor)) for m in mx]
-    pbeds_line   = [(v*p_los)/(30*(occ/100)) for v in pvol]
-    fp = go.Figure()
-    fp.add_trace(go.Scatter(x=mx, y=pvol, name="Projected Admissions",
-        mode="lines+markers", line=dict(color=PB, width=3), marker=dict(size=6)))
-    fp.add_trace(go.Scatter(x=mx, y=[mo_adm]*hor, name="Current Baseline",
-        mode="lines", line=dict(color=CR, width=2, dash="dash")))
-    fp.add_trace(go.Scatter(x=mx, y=pbeds_line, name="Beds Required",
-        mode="lines+markers", line=dict(color=PU, width=3), marker=dict(size=6), yaxis="y2"))
-    fp.add_trace(go.Scatter(x=mx, y=[cur_beds]*hor, name="Current Beds",
-        mode="lines", line=dict(color=TE, width=2, dash="dash"), yaxis="y2"))
-    fp.update_layout(
-        xaxis=dict(title="<b>Month</b>", tickfont=TF, title_font=TTF, showgrid=True, gridcolor=GC),
-        yaxis=dict(title="<b>Monthly Admissions</b>", tickfont=TF, title_font=TTF, showgrid=True, gridcolor=GC),
-        yaxis2=dict(title="<b>Beds Required</b>", overlaying="y", side="right", tickfont=TF, title_font=TTF, showgrid=False),
-        legend=dict(font=dict(size=14, color=text_color), orientation="h", y=1.06, x=0.5, xanchor="center",
-                    bgcolor="rgba(0,0,0,0)"),
-        height=460, margin=dict(l=70, r=80, t=60, b=60),
-        plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", hovermode="x unified"
-    )
-    st.plotly_chart(fp, use_container_width=True, config={"displayModeBar": False})
-
-    # KPI strip
-    k1, k2, k3, k4 = st.columns(4)
-    for col, lbl, val in [
-        (k1, "Projected Beds",     f"{int(p_beds):,}"),
-        (k2, "Projected Nurses",   f"{int(p_nur):,}"),
-        (k3, "Projected Doctors",  f"{int(p_doc):,}"),
-        (k4, "Bed Gap",            f"+{max(0,bg)}")
-    ]:
-        col.markdown(f'<div class="kpi"><div class="kpi-l">{lbl}</div>'
-                     f'<div class="kpi-v">{val}</div></div>', unsafe_allow_html=True)
+        # Capacity projection chart
+        mx           = list(range(1, hor+1))
+        pvol         = [mo_adm*(1+(gr/100)*(m/hor)) for m in mx]
+        pbeds_line   = [(v*p_los)/(30*(occ/100)) for v in pvol]
+        fp = go.Figure()
+        fp.add_trace(go.Scatter(x=mx, y=pvol, name="Projected Admissions",
+            mode="lines+markers", line=dict(color=PB, width=3), marker=dict(size=6)))
+        fp.add_trace(go.Scatter(x=mx, y=[mo_adm]*hor, name="Current Baseline",
+            mode="lines", line=dict(color=CR, width=2, dash="dash")))
+        fp.add_trace(go.Scatter(x=mx, y=pbeds_line, name="Beds Required",
+            mode="lines+markers", line=dict(color=PU, width=3), marker=dict(size=6), yaxis="y2"))
+        fp.add_trace(go.Scatter(x=mx, y=[cur_beds]*hor, name="Current Beds",
+            mode="lines", line=dict(color=TE, width=2, dash="dash"), yaxis="y2"))
+        fp.update_layout(
+            xaxis=dict(title="<b>Month</b>", tickfont=TF, title_font=TTF, showgrid=True, gridcolor=GC),
+            yaxis=dict(title="<b>Monthly Admissions</b>", tickfont=TF, title_font=TTF, showgrid=True, gridcolor=GC),
+            yaxis2=dict(title="<b>Beds Required</b>", overlaying="y", side="right", tickfont=TF, title_font=TTF, showgrid=False),
+            legend=dict(font=dict(size=14, color=text_color), orientation="h", y=1.06, x=0.5, xanchor="center",
+                        bgcolor="rgba(0,0,0,0)"),
+            height=460, margin=dict(l=70, r=80, t=60, b=60),
+            plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)", hovermode="x unified"
+        )
+        st.plotly_chart(fp, use_container_width=True, config={"displayModeBar": False})
+
+        # KPI strip
+        k1, k2, k3, k4 = st.columns(4)
+        for col, lbl, val in [
+            (k1, "Projected Beds",     f"{int(p_beds):,}"),
+            (k2, "Projected Nurses",   f"{int(p_nur):,}"),
+            (k3, "Projected Doctors",  f"{int(p_doc):,}"),
+            (k4, "Bed Gap",            f"+{max(0,bg)}")
+        ]:
+            col.markdown(f'<div class="kpi"><div class="kpi-l">{lbl}</div>'
+                         f'<div class="kpi-v">{val}</div></div>', unsafe_allow_html=True)
+
+    capacity_simulator()
 
     # ═══════════════════════════════════════════════════════════════════════
     # SECTION 2 — PDF REPORT BUILDER
     # ═══════════════════════════════════════════════════════════════════════
     st.markdown("<br>", unsafe_allow_html=True)
-    st.markdown("<div class='sec-hdr'>PDF Report Builder</div>", unsafe_allow_html=True)
-    st.caption("Select charts from across the dashboard, fill in report details, and generate a professional PDF report.")
-
-    CHART_GROUPS = {
-        "Executive Overview (Page 1)": [
-            ("p1_patient_flow",  "Patient Flow Trends"),
-            ("p1_outcomes",      "Appointment Outcomes (Donut)"),
-            ("p1_dept_demand",   "Department Demand"),
-            ("p1_peak_months",   "Peak Appointment Months"),
-            ("p1_completion",    "Appointment Completion Rate"),
-        ],
-        "Patient Demographics (Page 2)": [
-            ("p2_gender",        "Gender Distribution"),
-            ("p2_age",           "Age Group Distribution"),
-            ("p2_top_cities",    "Top 10 Cities by Patient Count"),
-            ("p2_payment",       "Payment Methods"),
-            ("p2_appt_trend",    "Appointment Trend 2024 vs 2025"),
-        ],
-        "Clinical & Disease Intelligence (Page 3)": [
-            ("p3_top_surgeries", "Top 10 Surgical Procedures"),
-            ("p3_surgery_trend", "Surgery Trend Over Time"),
-            ("p3_surgery_dept",  "Surgery Distribution by Department"),
-            ("p3_heatmap",       "Doctor-Department Surgery Heatmap"),
-        ],
-        "Operational Efficiency (Page 4)": [
-            ("p4_los",           "Avg Length of Stay by Department"),
-            ("p4_ward",          "Ward Utilization"),
-            ("p4_flow",          "Admissions vs Discharges"),
-        ],
-        "Staffing & Resources (Page 5)": [
-            ("p5_nurse_dist",    "Nurse Distribution by Department"),
-            ("p5_heatmap",       "Doctor Workload Heatmap"),
-            ("p5_pt_nurse_ratio","Patient-to-Nurse Ratio"),
-        ],
-        "Intelligence & Planning (Page 6)": [
-            ("p6_capacity_proj", "Capacity Projection Chart"),
-        ],
-    }
-
-    st.markdown(f"<div style='color:{text_color};font-size:16px;font-weight:800;margin-bottom:12px;'>Select Charts to Include</div>", unsafe_allow_html=True)
-    selected_ids = []
-
-    for group_name, charts in CHART_GROUPS.items():
-        st.markdown(f"""<div class='chart-group'>
+    # Fragment: ticking charts or editing report details reruns only the builder
+    @st.fragment
+    def report_builder():
+        st.markdown("<div class='sec-hdr'>PDF Report Builder</div>", unsafe_allow_html=True)
+        st.caption("Select charts from across the dashboard, fill in report details, and generate a professional PDF report.")
+
+        CHART_GROUPS = {
+            "Executive Overview (Page 1)": [
+                ("p1_patient_flow",  "Patient Flow Trends"),
+                ("p1_outcomes",      "Appointment Outcomes (Donut)"),
+                ("p1_dept_demand",   "Department Demand"),
+                ("p1_peak_months",   "Peak Appointment Months"),
+                ("p1_completion",    "Appointment Completion Rate"),
+            ],
+            "Patient Demographics (Page 2)": [
+                ("p2_gender",        "Gender Distribution"),
+                ("p2_age",           "Age Group Distribution"),
+                ("p2_top_cities",    "Top 10 Cities by Patient Count"),
+                ("p2_payment",       "Payment Methods"),
+                ("p2_appt_trend",    "Appointment Trend 2024 vs 2025"),
+            ],
+            "Clinical & Disease Intelligence (Page 3)": [
+                ("p3_top_surgeries", "Top 10 Surgical Procedures"),
+                ("p3_surgery_trend", "Surgery Trend Over Time"),
+                ("p3_surgery_dept",  "Surgery Distribution by Department"),
+                ("p3_heatmap",       "Doctor-Department Surgery Heatmap"),
+            ],
+            "Operational Efficiency (Page 4)": [
+                ("p4_los",           "Avg Length of Stay by Department"),
+                ("p4_ward",          "Ward Utilization"),
+                ("p4_flow",          "Admissions vs Discharges"),
+            ],
+            "Staffing & Resources (Page 5)": [
+                ("p5_nurse_dist",    "Nurse Distribution by Department"),
+                ("p5_heatmap",       "Doctor Workload Heatmap"),
+                ("p5_pt_nurse_ratio","Patient-to-Nurse Ratio"),
+            ],
+            "Intelligence & Planning (Page 6)": [
+                ("p6_capacity_proj", "Capacity Projection Chart"),
+            ],
+        }
+
+        st.markdown(f"<div style='color:{text_color};font-size:16px;font-weight:800;margin-bottom:12px;'>Select Charts to Include</div>", unsafe_allow_html=True)
+        selected_ids = []
+
+        for group_name, charts in CHART_GROUPS.items():
+            st.markdown(f"""<div class='chart-group'>
             <div class='chart-group-title'>{group_name}</div>""", unsafe_allow_html=True)
-        cols = st.columns(len(charts))
-        for col, (cid, clabel) in zip(cols, charts):
-            if col.checkbox(clabel, value=False, key=f"chk_{cid}"):
-                selected_ids.append(cid)
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    st.markdown("<br>", unsafe_allow_html=True)
-    st.markdown(f"<div style='color:{text_color};font-size:16px;font-weight:800;margin-bottom:12px;'>Report Details</div>", unsafe_allow_html=True)
-
-    rd1, rd2 = st.columns([1,1], gap="large")
-    with rd1:
-        st.markdown(f"<div class='report-label'>Report Title</div>", unsafe_allow_html=True)
-        r_title  = st.text_input("", value="Hospital Operations Report", key="pdf_title", label_visibility="collapsed")
-        st.markdown(f"<div class='report-label'>Prepared By</div>", unsafe_allow_html=True)
-        r_author = st.text_input("", value="Hospital Administrator", key="pdf_author", label_visibility="collapsed")
-        st.markdown(f"<div class='report-label'>Department</div>", unsafe_allow_html=True)
-        r_dept   = st.text_input("", value="Operations Management", key="pdf_dept", label_visibility="collapsed")
-    with rd2:
-        st.markdown(f"<div class='report-label'>Executive Summary (optional)</div>", unsafe_allow_html=True)
-        r_notes  = st.text_area("", placeholder="Key findings, observations, and recommendations...",
-                                height=120, key="pdf_notes", label_visibility="collapsed")
-        inc_kpi  = st.checkbox("Include KPI summary table",  value=True, key="pdf_kpi")
-        inc_alrt = st.checkbox("Include operational alerts", value=True, key="pdf_alrt")
-
-    n_sel = len(selected_ids)
-    if n_sel > 0:
-        st.info(f"✅ {n_sel} chart(s) selected for the report.")
-    else:
-        st.warning("⚠️ No charts selected — the report will include only KPIs, alerts, and summary text.")
-
-    if st.button("Generate PDF Report", key="gen_pdf", type="primary"):
-        with st.spinner("Building PDF — rendering charts..."):
+            cols = st.columns(len(charts))
+            for col, (cid, clabel) in zip(cols, charts):
+                if col.checkbox(clabel, value=False, key=f"chk_{cid}"):
+                    selected_ids.append(cid)
+            st.markdown("</div>", unsafe_allow_html=True)
+
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.markdown(f"<div style='color:{text_color};font-size:16px;font-weight:800;margin-bottom:12px;'>Report Details</div>", unsafe_allow_html=True)
+
+        rd1, rd2 = st.columns([1,1], gap="large")
+        with rd1:
+            st.markdown(f"<div class='report-label'>Report Title</div>", unsafe_allow_html=True)
+            r_title  = st.text_input("", value="Hospital Operations Report", key="pdf_title", label_visibility="collapsed")
+            st.markdown(f"<div class='report-label'>Prepared By</div>", unsafe_allow_html=True)
+            r_author = st.text_input("", value="Hospital Administrator", key="pdf_author", label_visibility="collapsed")
+            st.markdown(f"<div class='report-label'>Department</div>", unsafe_allow_html=True)
+            r_dept   = st.text_input("", value="Operations Management", key="pdf_dept", label_visibility="collapsed")
+        with rd2:
+            st.markdown(f"<div class='report-label'>Executive Summary (optional)</div>", unsafe_allow_html=True)
+            r_notes  = st.text_area("", placeholder="Key findings, observations, and recommendations...",
+                                    height=120, key="pdf_notes", label_visibility="collapsed")
+            inc_kpi  = st.checkbox("Include KPI summary table",  value=True, key="pdf_kpi")
+            inc_alrt = st.checkbox("Include operational alerts", value=True, key="pdf_alrt")
+
+        n_sel = len(selected_ids)
+        if n_sel > 0:
+            st.info(f"✅ {n_sel} chart(s) selected for the report.")
+        else:
+            st.warning("⚠️ No charts selected — the report will include only KPIs, alerts, and summary text.")
+
+        if st.button("Generate PDF Report", key="gen_pdf", type="primary"):
             # Recalculate alert metrics
             avg_daily  = avg_los * (len(bed_rec) / max(n_months * 30, 1))
             occ_pct    = round(avg_daily / max(cur_beds, 1) * 100, 1)
@@ -900,18 +1201,42 @@ def run():
                     idx = 0 if val >= hi else 1 if val >= mid else 2
                     alert_data_pdf.append((lvl, titles[idx], detls[idx]))
 
-            pdf_bytes = build_pdf(
+            st.session_state.pdf_job = _report_queue().submit(
                 selected_ids, r_title, r_author, r_dept, r_notes,
                 kpi_data, alert_data_pdf,
-                patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses
+                patients, appts, bed_rec, bed_full, surg, doctors, depts, nurses, F,
+                replaces=st.session_state.get("pdf_job")
             )
 
-        fname = f"Hospital_Report_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
-        st.download_button(
-            label="⬇️ Download PDF Report",
-            data=pdf_bytes, file_name=fname, mime="application/pdf",
-            use_container_width=True,
-        )
-        st.success(f"PDF ready — {n_sel} chart(s) included. Click above to download.")
+        # While the job is pending, only this small fragment reruns (once a second)
+        # to show its place in the queue and its progress; the finished report is
+        # shown by one full rerun, which stops the polling.
+        @st.fragment(run_every=1)
+        def report_progress(job_id):
+            job = _report_queue().get(job_id)
+            if job is None or not job.pending:
+                st.rerun()
+            if job.status == "queued":
+                ahead = _report_queue().ahead(job_id)
+                st.info(f"⏳ Report queued — {ahead} report(s) ahead of it." if ahead else "⏳ Report queued — starting shortly.")
+            else:
+                st.progress(job.done / max(job.total, 1),
+                            text=f"Building PDF — rendering charts ({job.done}/{job.total})...")
+
+        job_id = st.session_state.get("pdf_job")
+        job    = _report_queue().get(job_id) if job_id else None
+        if job is not None and job.pending:
+            report_progress(job_id)
+        elif job is not None and job.status == "done":
+            st.download_button(
+                label="⬇️ Download PDF Report",
+                data=job.pdf, file_name=job.file_name, mime="application/pdf",
+                use_container_width=True,
+            )
+            st.success(f"PDF ready — {job.total} chart(s) included. Click above to download.")
+        elif job is not None:
+            st.error(f"PDF generation failed: {job.error}")
+
+    report_builder()
 
     st.markdown("<br><br>", unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,172 @@
+import os
+import hashlib
+import sqlite3
+import pandas as pd
+
+from myPages.data import (EXCEL_PATH, SNAPSHOT_DIR, SCHEMA, sheet_names, base_sheet, delta_files,
+                          load_delta, frozen_cache, lookup, _base_version, _ProcessLock)
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+_ERRORS = (sqlite3.Error, pd.errors.DatabaseError, OSError) + ((duckdb.Error,) if HAS_DUCKDB else ())
+
+# Optional embedded SQL backend. With DASHBOARD_SQL=sqlite (or duckdb, when it is
+# installed) every sheet is loaded once per workbook version into an indexed
+# database file next to the snapshot, and the heavy join-then-aggregate charts run
+# as SQL that returns only the small result. Files appended to INCOMING_DIR are
+# inserted into that database as they arrive. Unset (or while the database is
+# busy), query() returns None and the pages keep their pandas path.
+#
+# The queries cover the unfiltered view only: the pages call query() when no
+# Global Filters are active and use the filter engine (myPages.filters) otherwise.
+ENGINE = os.environ.get("DASHBOARD_SQL", "").strip().lower()
+
+
+def enabled():
+    return ENGINE == "sqlite" or (ENGINE == "duckdb" and HAS_DUCKDB)
+
+
+# ── Database build ─────────────────────────────────────────────────────────────
+def _connect(db, read_only=True):
+    if ENGINE == "duckdb":
+        return duckdb.connect(db, read_only=read_only)
+    return sqlite3.connect(f"file:{db}?mode=ro" if read_only else db, uri=read_only)
+
+def _load(con, name, df):
+    if ENGINE == "duckdb":
+        con.register("_frame", df)
+        con.execute(f'CREATE TABLE "{name}" AS SELECT * FROM _frame')
+        con.unregister("_frame")
+    else:
+        df.to_sql(name, con, index=False)
+    for col, kind in SCHEMA.get(name, {}).items():
+        if kind in ("id", "date") and col in df.columns:
+            con.execute(f'CREATE INDEX "ix_{name}_{col}" ON "{name}" ("{col}")')
+
+def _build(db, path):
+    # workbook rows only; appended files are added by _append()
+    tmp = f"{db}.{os.getpid()}.tmp"
+    con = _connect(tmp, read_only=False)
+    try:
+        for name in sheet_names(path):
+            _load(con, name, base_sheet(name, path))
+        con.execute('CREATE TABLE "_deltas" (seq INTEGER, sheet TEXT, file TEXT, size BIGINT, mtime BIGINT)')
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp, db)
+
+def _applied(db):
+    con = _connect(db)
+    try:
+        return tuple(tuple(r) for r in con.execute('SELECT sheet, file, size, mtime FROM "_deltas" ORDER BY seq').fetchall())
+    finally:
+        con.close()
+
+def _append(db, deltas, start):
+    con = _connect(db, read_only=False)
+    try:
+        for seq, (name, *delta) in enumerate(deltas, start):
+            cols = [r[1] for r in con.execute(f'PRAGMA table_info("{name}")').fetchall()]
+            df   = load_delta(name, tuple(delta))
+            df   = df[[c for c in df.columns if c in cols]]
+            if ENGINE == "duckdb":
+                con.register("_frame", df)
+                con.execute(f'INSERT INTO "{name}" BY NAME SELECT * FROM _frame')
+                con.unregister("_frame")
+            else:
+                df.to_sql(name, con, index=False, if_exists="append")
+            con.execute('INSERT INTO "_deltas" VALUES (?, ?, ?, ?, ?)', (seq, name, *delta))
+        con.commit()
+    finally:
+        con.close()
+
+_synced = {}   # db → appended files it holds, as seen by this process
+
+def _database(path):
+    names   = sheet_names(path)
+    version = "-".join(_base_version(n, path) for n in names)
+    db      = os.path.join(SNAPSHOT_DIR, f"warehouse.{hashlib.sha256(version.encode()).hexdigest()[:12]}.{ENGINE}")
+    deltas  = tuple(sorted(((n,) + d for n in names for d in delta_files(n, path)), key=lambda d: (d[3], d)))
+    if _synced.get(db) == deltas:
+        return db, deltas
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with _ProcessLock(os.path.join(SNAPSHOT_DIR, ".sql.lock")):
+        if not os.path.exists(db):
+            _build(db, path)
+            for fn in os.listdir(SNAPSHOT_DIR):
+                if fn.startswith("warehouse.") and fn != os.path.basename(db):
+                    try:
+                        os.remove(os.path.join(SNAPSHOT_DIR, fn))
+                    except OSError:
+                        pass
+        applied = _applied(db)
+        if applied != deltas[:len(applied)]:
+            # an appended file was rewritten or withdrawn: back to the workbook rows
+            _build(db, path)
+            applied = ()
+        if len(applied) < len(deltas):
+            _append(db, deltas[len(applied):], len(applied))
+    _synced[db] = deltas
+    return db, deltas
+
+def database(path=EXCEL_PATH):
+    """Path of the database for the current data version, built on first use and
+    brought up to date with appended files; None if unavailable."""
+    if not enabled():
+        return None
+    try:
+        return _database(path)[0]
+    except _ERRORS:   # TimeoutError from the lock is an OSError
+        return None
+
+
+# ── Queries ────────────────────────────────────────────────────────────────────
+# Shared by the page charts and the PDF report
+SURGEON_DEPT_SQL = """
+    SELECT doc.FName, d.dept_Name, COUNT(*) AS Count
+    FROM SurgeryRecord s
+    JOIN Doctor doc        ON doc.doct_Id = s.surgeon_Id
+    LEFT JOIN Department d ON d.dept_Id   = doc.dept_Id
+    WHERE doc.FName IS NOT NULL AND d.dept_Name IS NOT NULL
+    GROUP BY 1, 2"""
+
+DOCTOR_WORKLOAD_SQL = """
+    SELECT doc.FName, d.dept_Name, COUNT(*) AS Count
+    FROM Appointment a
+    JOIN Doctor doc        ON doc.doct_Id = a.doct_Id
+    LEFT JOIN Department d ON d.dept_Id   = doc.dept_Id
+    WHERE doc.FName IS NOT NULL AND d.dept_Name IS NOT NULL
+    GROUP BY 1, 2"""
+
+def doctor_dept_counts(doct_ids, path=EXCEL_PATH):
+    """pandas counterpart of the two queries above, for a column of doct_Id values
+    (e.g. the filtered rows' surgeon_Id): FName, dept_Name, Count. The names come
+    back as plain strings, as from SQL, so a pivot sorts them alphabetically
+    rather than in category order."""
+    names = pd.DataFrame({"FName":     lookup(doct_ids, "doct_Id", "FName", path).astype(object),
+                          "dept_Name": lookup(doct_ids, "doct_Id", "dept_Name", path).astype(object)})
+    return names.groupby(["FName", "dept_Name"]).size().reset_index(name="Count")
+
+@frozen_cache(max_entries=256)
+def _cached_query(sql, db, deltas):
+    con = _connect(db)
+    try:
+        if ENGINE == "duckdb":
+            return con.execute(sql).df()
+        return pd.read_sql_query(sql, con)
+    finally:
+        con.close()
+
+def query(sql, path=EXCEL_PATH):
+    """Run an aggregate query over the unfiltered data; None when the backend is off or busy."""
+    if not enabled():
+        return None
+    try:
+        return _cached_query(sql, *_database(path))
+    except _ERRORS:
+        return None
@@ -0,0 +1,114 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+from myPages import data, sqlstore
+
+# Listed out of alphabetical order on purpose, so that anything following the
+# sheet's row order instead of sorting by name shows up in the tests.
+DEPARTMENTS = ["Pediatrics", "Cardiology", "Oncology", "Emergency", "Neurology", "ENT"]
+START       = pd.Timestamp("2024-01-01")
+
+
+def build_workbook(path, patients=80, seed=0):
+    """Write a small hospital workbook with every sheet the pages read."""
+    rng = np.random.default_rng(seed)
+    n_p, n_a, n_b, n_s = patients, patients * 4, patients, patients // 2
+    days = lambda n, span=731: START + pd.to_timedelta(rng.integers(0, span, n), unit="D")
+
+    admitted   = days(n_b)
+    discharged = (admitted + pd.to_timedelta(rng.integers(1, 20, n_b), unit="D")).where(rng.random(n_b) > .1)
+    admission  = pd.Series(np.arange(1, n_b + 1), dtype="float").where(rng.random(n_b) > .05)
+    sheets = {
+        "Patients":      pd.DataFrame({"patient_Id": range(1, n_p + 1),
+                                       "FName": [f"Pat{i}" for i in range(n_p)],
+                                       "Gender": rng.choice(["Male", "Female"], n_p),
+                                       "Date_Of_Birth": pd.Timestamp("1950-01-01")
+                                                        + pd.to_timedelta(rng.integers(0, 25000, n_p), unit="D"),
+                                       "city": rng.choice(["Delhi", "Pune", "Jaipur", "Indore"], n_p),
+                                       "mode_of_payment": rng.choice(["Cash", "Card", "UPI", "Insurance"], n_p)}),
+        "Appointment":   pd.DataFrame({"appointment_Id": range(1, n_a + 1),
+                                       "patient_Id": rng.integers(1, n_p + 1, n_a),
+                                       "doct_Id": rng.integers(101, 121, n_a),
+                                       "appointment_Date": days(n_a),
+                                       "appointment_status": rng.choice(["Completed", "Cancelled", "No Show", "Scheduled"],
+                                                                        n_a, p=[.7, .1, .05, .15]),
+                                       "reason": rng.choice(["Fever", "Checkup", "Injury"], n_a)}),
+        "BedRecords":    pd.DataFrame({"admission_Id": admission,
+                                       "patient_Id": rng.integers(1, n_p + 1, n_b),
+                                       "bed_No": rng.integers(1, 31, n_b),
+                                       "admission_Date": admitted, "discharge_Date": discharged}),
+        "Bed":           pd.DataFrame({"bed_No": range(1, 31), "ward_No": rng.integers(1, 5, 30)}),
+        "Ward":          pd.DataFrame({"ward_No": range(1, 5), "ward_Name": ["Ward D", "Ward B", "Ward A", "Ward C"],
+                                       "dept_Id": [1, 2, 3, 4]}),
+        "Department":    pd.DataFrame({"dept_Id": range(1, len(DEPARTMENTS) + 1), "dept_Name": DEPARTMENTS}),
+        "Doctor":        pd.DataFrame({"doct_Id": range(101, 121), "FName": [f"Dr{i:02d}" for i in range(20)][::-1],
+                                       "dept_Id": rng.integers(1, len(DEPARTMENTS) + 1, 20)}),
+        "Nurse":         pd.DataFrame({"nurse_Id": range(1, 31), "dept_Id": rng.integers(1, len(DEPARTMENTS) + 1, 30)}),
+        "SurgeryRecord": pd.DataFrame({"surgery_Id": range(1, n_s + 1),
+                                       "patient_Id": rng.integers(1, n_p + 1, n_s),
+                                       "surgeon_Id": rng.integers(101, 121, n_s),
+                                       "surgery_Date": days(n_s),
+                                       "surgery_Type": rng.choice(["Bypass", "Biopsy", "Hernia Repair"], n_s)}),
+        "RoomRecords":   pd.DataFrame({"room_No": rng.integers(1, 11, n_b),
+                                       "patient_Id": rng.integers(1, n_p + 1, n_b),
+                                       "admission_Date": admitted}),
+        "Room":          pd.DataFrame({"room_No": range(1, 11), "dept_Id": rng.integers(1, len(DEPARTMENTS) + 1, 10)}),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with pd.ExcelWriter(path) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return sheets
+
+
+def more_rows(sheets, sheet, n, seed=1):
+    """`n` new rows for an appended file of `sheet`: existing rows with fresh IDs,
+    dated after the workbook's rows."""
+    rng  = np.random.default_rng(seed)
+    base = sheets[sheet]
+    rows = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+    key  = base.columns[0]
+    rows[key] = np.arange(n) + int(base[key].max()) + 1 + 1000 * seed
+    for col in rows.columns:
+        if pd.api.types.is_datetime64_any_dtype(rows[col]):
+            rows[col] = rows[col] + pd.Timedelta(days=800)
+    return rows
+
+
+def drop_file(name, frame, seconds=1):
+    """Write `frame` into INCOMING_DIR as `name`, `seconds` newer than the workbook."""
+    os.makedirs(data.INCOMING_DIR, exist_ok=True)
+    target = os.path.join(data.INCOMING_DIR, name)
+    frame.to_csv(target, index=False)
+    stamp = os.stat(data.EXCEL_PATH).st_mtime_ns + seconds * 10**9
+    os.utime(target, ns=(stamp, stamp))
+    return target
+
+
+def reset_caches():
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    data._manifest = None
+    with data._running_lock:
+        data._running.clear()
+        data._running_locks.clear()
+    sqlstore._synced.clear()
+
+
+@pytest.fixture
+def workbook(tmp_path, monkeypatch):
+    """A fresh workbook at the default data/dataFinal.xlsx, relative to a temporary
+    working directory; yields the sheets it was written from."""
+    monkeypatch.chdir(tmp_path)
+    sheets = build_workbook(data.EXCEL_PATH)
+    reset_caches()
+    yield sheets
+    reset_caches()
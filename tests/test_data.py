@@ -0,0 +1,96 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import drop_file, more_rows
+from myPages.data import (INCOMING_DIR, apply_schema, cube_counts, delta_files, incremental,
+                          load_delta, load_sheet, _append_rows)
+
+
+def _schema(frame, sheet="Appointment"):
+    return apply_schema(frame.copy(), sheet)
+
+
+def _delta(name):
+    return next(d for d in delta_files("Appointment") if d[0] == name)
+
+
+def test_append_rows_keeps_the_schema_of_both_sides(workbook):
+    base  = _schema(workbook["Appointment"])
+    extra = more_rows(workbook, "Appointment", 5)
+    extra.loc[0, "appointment_status"] = "Rescheduled"
+    delta = _schema(extra)
+
+    out = _append_rows(base, delta, "Appointment")
+    assert len(out) == len(base) + len(delta)
+    assert out.dtypes.astype(str).equals(base.dtypes.astype(str))
+    assert "Rescheduled" in out["appointment_status"].cat.categories
+    assert out["appointment_status"].astype(object).tolist() == \
+        base["appointment_status"].astype(object).tolist() + delta["appointment_status"].astype(object).tolist()
+    assert _append_rows(base, delta.iloc[:0], "Appointment") is base
+
+
+def test_load_sheet_follows_files_added_rewritten_and_withdrawn(workbook):
+    base = load_sheet("Appointment")
+    assert len(base) == len(workbook["Appointment"])
+
+    first = drop_file("Appointment_1.csv", more_rows(workbook, "Appointment", 10, seed=1), seconds=1)
+    drop_file("Appointment_2.csv", more_rows(workbook, "Appointment", 20, seed=2), seconds=2)
+    grown = load_sheet("Appointment")
+    assert len(grown) == len(base) + 30
+    second = load_delta("Appointment", _delta("Appointment_2.csv"))
+    assert grown["appointment_Id"].tail(20).tolist() == second["appointment_Id"].tolist()
+    pd.testing.assert_frame_equal(grown.iloc[:len(base)], base)
+
+    rewritten = more_rows(workbook, "Appointment", 4, seed=3)
+    drop_file("Appointment_1.csv", rewritten, seconds=3)
+    ids = load_sheet("Appointment")["appointment_Id"].tolist()
+    assert len(ids) == len(base) + 24
+    assert ids[len(base):len(base) + 4] == rewritten["appointment_Id"].tolist()
+
+    os.remove(first)
+    assert len(load_sheet("Appointment")) == len(base) + 20
+    os.remove(os.path.join(INCOMING_DIR, "Appointment_2.csv"))
+    pd.testing.assert_frame_equal(load_sheet("Appointment"), base)
+
+
+def test_incremental_folds_in_only_new_files(workbook):
+    calls = []
+
+    def build(version):
+        calls.append("build")
+        return 0
+
+    def extend(total, sheet, delta):
+        calls.append(delta[0])
+        return total + len(load_delta(sheet, delta))
+
+    value = lambda: incremental("test", ("Appointment",), build, extend)
+
+    assert value() == 0
+    drop_file("Appointment_a.csv", more_rows(workbook, "Appointment", 3, seed=1), seconds=1)
+    assert value() == 3
+    drop_file("Appointment_b.csv", more_rows(workbook, "Appointment", 5, seed=2), seconds=2)
+    assert value() == 8
+    assert value() == 8
+    assert calls == ["build", "build", "Appointment_a.csv", "Appointment_b.csv"]
+
+    calls.clear()
+    drop_file("Appointment_a.csv", more_rows(workbook, "Appointment", 7, seed=3), seconds=3)
+    assert value() == 12
+    assert calls == ["build", "Appointment_a.csv", "Appointment_b.csv"]
+
+    calls.clear()
+    os.remove(os.path.join(INCOMING_DIR, "Appointment_b.csv"))
+    assert value() == 7
+    assert calls == ["build", "Appointment_a.csv"]
+
+
+def test_cube_counts_include_appended_rows(workbook):
+    drop_file("Appointment_1.csv", more_rows(workbook, "Appointment", 25))
+    appts = load_sheet("Appointment")
+    assert cube_counts("appointments") == len(appts)
+    counts = cube_counts("appointments", "appointment_status")
+    expected = appts["appointment_status"].astype(object).value_counts()
+    assert counts.to_dict() == expected.to_dict()
@@ -0,0 +1,50 @@
+import importlib
+import os
+import re
+
+import pytest
+
+pytest.importorskip("streamlit.testing.v1")
+
+from streamlit.testing.v1 import AppTest
+from conftest import ROOT
+from myPages.filters import GlobalFilters
+
+NOTHING = GlobalFilters(depts=("No such department",))
+
+
+def _run(page, monkeypatch, filters):
+    module = importlib.import_module(f"myPages.page{page + 1}")
+    monkeypatch.setattr(module, "active_filters", lambda *args, **kwargs: filters)
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.session_state["current_page"] = page
+    at.run()
+    assert not at.exception, [e.value for e in at.exception]
+    return at
+
+
+def _text(at):
+    return " ".join(re.sub(r"<[^>]+>", " ", m.value) for m in at.markdown).split()
+
+
+def test_overview_kpis_drop_to_zero(workbook, monkeypatch):
+    shown = " ".join(_text(_run(0, monkeypatch, None)))
+    assert f"Appointments {len(workbook['Appointment'])}" in shown
+
+    shown = " ".join(_text(_run(0, monkeypatch, NOTHING)))
+    assert f"Total Patients {len(workbook['Patients'])}" in shown
+    assert "Appointments 0 Admissions 0 Cancellation Rate 0.0%" in shown
+
+
+@pytest.mark.parametrize("page", range(1, 5))
+def test_page_says_there_is_no_data(workbook, monkeypatch, page):
+    at = _run(page, monkeypatch, NOTHING)
+    assert [i.value for i in at.info] == ["No data for the selected filters"]
+    assert not at.get("plotly_chart")
+
+
+def test_planning_page_plans_for_no_admissions(workbook, monkeypatch):
+    at = _run(5, monkeypatch, NOTHING)
+    shown = " ".join(_text(at))
+    assert "Monthly admissions: 0" in shown
+    assert f"Doctors: {len(workbook['Doctor'])}" in shown
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import START, drop_file, more_rows
+from myPages.data import FACT_DATES, load_sheet
+from myPages.filters import FactIndex, GlobalFilters, apply
+
+FILTERS = [
+    GlobalFilters(),
+    GlobalFilters(start=START + pd.Timedelta(days=100)),
+    GlobalFilters(end=START + pd.Timedelta(days=400)),
+    GlobalFilters(start=START + pd.Timedelta(days=100), end=START + pd.Timedelta(days=100)),
+    GlobalFilters(start=START + pd.Timedelta(days=400), end=START + pd.Timedelta(days=100)),
+    GlobalFilters(depts=("Cardiology",)),
+    GlobalFilters(depts=("Oncology", "Pediatrics"), statuses=("Completed",)),
+    GlobalFilters(statuses=("Cancelled", "No Show")),
+    GlobalFilters(start=START + pd.Timedelta(days=30), end=START + pd.Timedelta(days=900),
+                  depts=("ENT", "Emergency", "Cardiology"), statuses=("Completed", "Scheduled")),
+    GlobalFilters(depts=("No such department",)),
+]
+
+
+def _brute_force(dates, dims, f):
+    day  = pd.Series(pd.to_datetime(dates)).dt.normalize()
+    keep = np.ones(len(day), dtype=bool)
+    if f.start is not None:
+        keep &= (day >= f.start).to_numpy()
+    if f.end is not None:
+        keep &= (day <= f.end).to_numpy()
+    for dim, values in (("dept_Name", f.depts), ("appointment_status", f.statuses)):
+        if values is not None and dim in dims:
+            keep &= pd.Series(dims[dim]).isin(values).to_numpy()
+    return np.flatnonzero(keep)
+
+
+def _departments(sheets, sheet, df):
+    doctor = sheets["Doctor"].set_index("doct_Id")["dept_Id"]
+    if sheet == "Appointment":
+        dept = df["doct_Id"].map(doctor)
+    elif sheet == "SurgeryRecord":
+        dept = df["surgeon_Id"].map(doctor)
+    elif sheet == "BedRecords":
+        ward = df["bed_No"].map(sheets["Bed"].set_index("bed_No")["ward_No"])
+        dept = ward.map(sheets["Ward"].set_index("ward_No")["dept_Id"])
+    else:
+        dept = df["room_No"].map(sheets["Room"].set_index("room_No")["dept_Id"])
+    return dept.map(sheets["Department"].set_index("dept_Id")["dept_Name"]).astype(object)
+
+
+@pytest.mark.parametrize("f", FILTERS)
+def test_fact_index_matches_a_brute_force_mask(f):
+    rng    = np.random.default_rng(7)
+    n      = 500
+    dates  = pd.Series(START + pd.to_timedelta(rng.integers(0, 1000 * 24, n), unit="h"))
+    dates[rng.random(n) < .05] = pd.NaT
+    dims   = {"dept_Name": rng.choice(["Cardiology", "ENT", "Emergency", "Oncology", None], n),
+              "appointment_status": rng.choice(["Completed", "Cancelled", "No Show", "Scheduled"], n)}
+    # three segments, as after two appended files
+    cuts   = [0, 300, 420, n]
+    index  = FactIndex(dates[:300], {k: v[:300] for k, v in dims.items()})
+    for lo, hi in zip(cuts[1:], cuts[2:]):
+        index = index.extend(FactIndex(dates[lo:hi].reset_index(drop=True), {k: v[lo:hi] for k, v in dims.items()}))
+
+    assert index.n == n
+    np.testing.assert_array_equal(index.rows(f), _brute_force(dates, dims, f))
+
+
+@pytest.mark.parametrize("f", FILTERS[1:])
+@pytest.mark.parametrize("sheet", list(FACT_DATES))
+def test_apply_matches_a_brute_force_mask(workbook, sheet, f):
+    if sheet == "Appointment":
+        drop_file("Appointment_1.csv", more_rows(workbook, "Appointment", 40))
+    df   = load_sheet(sheet)
+    dims = {"dept_Name": _departments(workbook, sheet, df)}
+    if sheet == "Appointment":
+        dims["appointment_status"] = df["appointment_status"].astype(object)
+    expected = df.iloc[_brute_force(df[FACT_DATES[sheet]], dims, f)]
+
+    pd.testing.assert_frame_equal(apply(df, sheet, f), expected)
+    derived = df.assign(src_row=np.arange(len(df))).iloc[::-1]
+    pd.testing.assert_frame_equal(apply(derived, sheet, f, row_col="src_row").sort_values("src_row").drop(columns="src_row"),
+                                  expected)
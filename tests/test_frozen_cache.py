@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from myPages.data import frozen_cache
+
+NEW = {"o": "z", "i": 9, "c": "y", "d": pd.Timestamp("2030-01-01"), "n": 9.0,
+       "s": "z", "b": False, "k": 9}
+
+
+@frozen_cache()
+def _table():
+    return pd.DataFrame({
+        "o": ["a", "b"],
+        "i": pd.array([1, 2], dtype="Int64"),
+        "c": pd.Categorical(["x", "y"]),
+        "d": pd.to_datetime(["2024-01-01", "2024-01-02"]),
+        "n": [1.0, 2.0],
+        "s": pd.array(["p", "q"], dtype="string"),
+        "b": pd.array([True, False], dtype="boolean"),
+        "k": [1, 2],
+    })
+
+
+def _write(df, col, how):
+    if how == "values":
+        df[col].values[0] = NEW[col]
+    elif how == "to_numpy":
+        df[col].to_numpy()[0] = np.datetime64("2030-01-01") if col == "d" else NEW[col]
+    elif how == "array":
+        df[col].array[0] = NEW[col]
+    elif how == "series":
+        df[col].iloc[0] = NEW[col]
+    elif how == "iloc":
+        df.iloc[0, df.columns.get_loc(col)] = NEW[col]
+    elif how == "loc":
+        df.loc[0, col] = NEW[col]
+    elif how == "assign":
+        df[col] = df[col].iloc[::-1].to_numpy()
+
+
+@pytest.mark.parametrize("how", ["values", "to_numpy", "array", "series", "iloc", "loc", "assign"])
+@pytest.mark.parametrize("col", list(NEW))
+def test_writes_to_a_handed_out_frame_do_not_reach_the_cache(col, how):
+    expected = _table().copy(deep=True)
+    try:
+        _write(_table(), col, how)
+    except (ValueError, TypeError):
+        pass   # read-only array refused the write
+    pd.testing.assert_frame_equal(_table(), expected)
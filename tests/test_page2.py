@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from myPages.data import load_sheet
+from myPages.page2 import EVENT_COLUMNS, journey_events
+
+COLORS = {"Completed": "green", "Cancelled": "coral", "No-Show": "amber",
+          "Appointment": "blue", "Admission": "navy", "Surgery": "purple"}
+
+
+def _row_loop(appointments, bed_records, surgeries, pid):
+    # The per-patient iterrows() builder that journey_events() replaced
+    rows = []
+    pa = appointments[appointments["patient_Id"] == pid].dropna(subset=["appointment_Date"])
+    for _, r in pa.iterrows():
+        st_ = str(r["appointment_status"]).strip()
+        clr = COLORS["Completed"] if "complet" in st_.lower() else COLORS["Cancelled"] if "cancel" in st_.lower() else \
+              COLORS["No-Show"] if "no" in st_.lower() else COLORS["Appointment"]
+        rows.append(dict(patient_Id=pid, Start=r["appointment_Date"], Finish=r["appointment_Date"] + pd.Timedelta(hours=1),
+                         Category="Appointment", Label=f"Appointment — {st_}",
+                         Detail=f"Doctor: {r['doct_Id']} | Reason: {r.get('reason','N/A')}", Color=clr))
+    pb = bed_records[bed_records["patient_Id"] == pid].dropna(subset=["admission_Date"])
+    for _, r in pb.iterrows():
+        fin = r["discharge_Date"] if pd.notna(r["discharge_Date"]) else r["admission_Date"] + pd.Timedelta(days=1)
+        los = int(r["LOS"]) if pd.notna(r["LOS"]) else "N/A"
+        rows.append(dict(patient_Id=pid, Start=r["admission_Date"], Finish=fin, Category="Admission", Label="Inpatient Stay",
+                         Detail=f"Bed: {r['bed_No']} | LOS: {los} days | Discharge: "
+                                f"{fin.strftime('%d %b %Y') if pd.notna(r['discharge_Date']) else 'Pending'}",
+                         Color=COLORS["Admission"]))
+    ps = surgeries[surgeries["patient_Id"] == pid].dropna(subset=["surgery_Date"])
+    for _, r in ps.iterrows():
+        rows.append(dict(patient_Id=pid, Start=r["surgery_Date"], Finish=r["surgery_Date"] + pd.Timedelta(hours=3),
+                         Category="Surgery", Label=str(r["surgery_Type"]),
+                         Detail=f"Surgeon ID: {r['surgeon_Id']} | Type: {r['surgery_Type']}", Color=COLORS["Surgery"]))
+    return pd.DataFrame(rows, columns=EVENT_COLUMNS)
+
+
+def _normalised(ev):
+    ev = ev.astype({"patient_Id": "int64", "Start": "datetime64[ns]", "Finish": "datetime64[ns]"})
+    return ev.sort_values(EVENT_COLUMNS, ignore_index=True)
+
+
+@pytest.fixture
+def sheets(workbook):
+    appts = load_sheet("Appointment")
+    # a missing date, a missing status and an undischarged stay
+    appts = appts.assign(appointment_Date=appts["appointment_Date"].mask(appts.index == 0),
+                         appointment_status=appts["appointment_status"].mask(appts.index == 1))
+    beds  = load_sheet("BedRecords")
+    beds  = beds.assign(LOS=(beds["discharge_Date"] - beds["admission_Date"]).dt.days)
+    return appts, beds, load_sheet("SurgeryRecord")
+
+
+def test_journey_events_match_the_row_loop(sheets):
+    appts, beds, surgs = sheets
+    pids = sorted(set(appts["patient_Id"]) | set(beds["patient_Id"]) | set(surgs["patient_Id"]))
+    for pid in pids:
+        got = journey_events(appts[appts["patient_Id"] == pid], beds[beds["patient_Id"] == pid],
+                             surgs[surgs["patient_Id"] == pid], COLORS)
+        pd.testing.assert_frame_equal(_normalised(got), _normalised(_row_loop(appts, beds, surgs, pid)))
+
+
+def test_journey_events_cover_many_patients_at_once(sheets):
+    appts, beds, surgs = sheets
+    together = journey_events(appts, beds, surgs, COLORS)
+    each     = pd.concat([_row_loop(appts, beds, surgs, pid) for pid in set(appts["patient_Id"]) | set(beds["patient_Id"])
+                          | set(surgs["patient_Id"])], ignore_index=True)
+    pd.testing.assert_frame_equal(_normalised(together), _normalised(each))
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+from myPages import page6
+from myPages.page6 import PngCache, ReportQueue, build_chart, _load_p6
+
+
+def _bars(fig):
+    ax = fig.axes[0]
+    return {t.get_text(): p.get_width() for t, p in zip(ax.get_yticklabels(), ax.patches)}
+
+
+def test_ward_chart_counts_admissions_with_an_id(workbook):
+    beds, wards = workbook["BedRecords"], workbook["Ward"]
+    ward  = beds["bed_No"].map(workbook["Bed"].set_index("bed_No")["ward_No"]).map(wards.set_index("ward_No")["ward_Name"])
+    assert beds["admission_Id"].isna().any()
+
+    fig = build_chart("p4_ward", *_load_p6())[1]
+    assert _bars(fig) == beds.groupby(ward)["admission_Id"].count().to_dict()
+
+
+# ── PNG cache ──────────────────────────────────────────────────────────────────
+def _age(cache, key, seconds):
+    stamp = time.time() - seconds
+    os.utime(cache._file(key), (stamp, stamp))
+
+
+def test_png_cache_keeps_recent_charts_in_memory_and_all_on_disk(tmp_path):
+    cache = PngCache(str(tmp_path), max_bytes=10, max_files=10)
+    assert cache.get("a") is None
+
+    cache.put("a", ("Chart A", b"aaaaaa"))
+    cache.put("b", ("Chart B", b"bbbbbb"))
+    assert list(cache.items) == ["b"] and cache.size == 6
+
+    assert cache.get("a") == ("Chart A", b"aaaaaa")     # read back from disk
+    assert list(cache.items) == ["a"]
+    assert PngCache(str(tmp_path)).get("b") == ("Chart B", b"bbbbbb")
+
+
+def test_png_cache_prunes_the_least_recently_used_files(tmp_path):
+    cache = PngCache(str(tmp_path), max_bytes=0, max_files=2)
+    cache.put("a", ("A", b"1"))
+    cache.put("b", ("B", b"2"))
+    _age(cache, "a", 30)
+    _age(cache, "b", 20)
+    assert cache.get("a") == ("A", b"1")                # refreshes a's mtime
+
+    cache.put("c", ("C", b"3"))
+    assert sorted(os.listdir(tmp_path)) == ["a.chart", "c.chart"]
+    assert cache.get("b") is None
+
+
+# ── Report queue ───────────────────────────────────────────────────────────────
+def _wait(cond, timeout=10):
+    deadline = time.time() + timeout
+    while not cond():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_report_queue_runs_jobs_in_order(monkeypatch):
+    release = threading.Event()
+
+    def build_pdf(chart_ids, title, progress=None):
+        if title == "broken":
+            raise RuntimeError("no charts")
+        for i, _ in enumerate(chart_ids, 1):
+            progress(i, len(chart_ids))
+        release.wait(10)
+        return f"{title}:{len(chart_ids)}".encode()
+
+    monkeypatch.setattr(page6, "build_pdf", build_pdf)
+    queue = ReportQueue(workers=1)
+    try:
+        first  = queue.submit(["p1_kpis", "p3_heatmap"], "first")
+        _wait(lambda: queue.get(first).status == "running")
+        second = queue.submit(["p4_ward"], "second")
+        broken = queue.submit([], "broken")
+        assert queue.get(second).status == "queued" and queue.get(second).pending
+        assert (queue.ahead(first), queue.ahead(second), queue.ahead(broken)) == (0, 0, 1)
+        _wait(lambda: queue.get(first).done == 2)
+        assert queue.get(first).pdf is None
+
+        release.set()
+        _wait(lambda: not queue.get(broken).pending)
+    finally:
+        queue.executor.shutdown(wait=True)
+
+    job = queue.get(first)
+    assert (job.status, job.pdf, job.total) == ("done", b"first:2", 2)
+    assert job.file_name.startswith("Hospital_Report_") and job.file_name.endswith(".pdf")
+    assert queue.get(second).pdf == b"second:1"
+    assert (queue.get(broken).status, queue.get(broken).error, queue.get(broken).pdf) == ("failed", "no charts", None)
+    assert queue.get("no such job") is None
+
+
+def test_report_queue_drops_expired_and_surplus_jobs(monkeypatch):
+    monkeypatch.setattr(page6, "build_pdf", lambda chart_ids, title, progress=None: title.encode())
+    monkeypatch.setattr(page6, "REPORT_JOBS_MAX", 3)
+    queue = ReportQueue(workers=1)
+    try:
+        ids = [queue.submit([], f"report {i}") for i in range(5)]
+        _wait(lambda: queue.get(ids[-1]) is not None and not queue.get(ids[-1]).pending)
+        assert list(queue.jobs) == ids[2:]
+
+        # a session's next report replaces its finished one
+        again = queue.submit([], "again", replaces=ids[4])
+        _wait(lambda: not queue.get(again).pending)
+        assert list(queue.jobs) == [ids[2], ids[3], again]
+
+        queue.jobs[ids[2]].finished -= page6.REPORT_JOB_TTL + 1
+        assert queue.get(ids[2]) is None
+        assert list(queue.jobs) == [ids[3], again]
+    finally:
+        queue.executor.shutdown(wait=True)
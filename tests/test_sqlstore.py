@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from myPages import sqlstore
+from myPages.data import load_sheet
+from myPages.sqlstore import doctor_dept_counts, SURGEON_DEPT_SQL, DOCTOR_WORKLOAD_SQL
+
+
+@pytest.mark.parametrize("sql, sheet, column", [(SURGEON_DEPT_SQL, "SurgeryRecord", "surgeon_Id"),
+                                                (DOCTOR_WORKLOAD_SQL, "Appointment", "doct_Id")])
+def test_pandas_counts_match_the_query(workbook, monkeypatch, sql, sheet, column):
+    monkeypatch.setattr(sqlstore, "ENGINE", "sqlite")
+    expected = sqlstore.query(sql)
+    assert expected is not None
+
+    counts = doctor_dept_counts(load_sheet(sheet)[column])
+    pd.testing.assert_frame_equal(counts.sort_values(["FName", "dept_Name"], ignore_index=True),
+                                  expected.sort_values(["FName", "dept_Name"], ignore_index=True),
+                                  check_dtype=False)
+    pivot = lambda df: df.pivot(index="FName", columns="dept_Name", values="Count").fillna(0)
+    pd.testing.assert_frame_equal(pivot(counts), pivot(expected), check_dtype=False)
+    assert list(pivot(counts).columns) == sorted(pivot(counts).columns)
+
+
+@pytest.mark.parametrize("chart_id", ["p3_heatmap", "p5_heatmap"])
+def test_report_heatmap_is_the_same_with_and_without_sql(workbook, monkeypatch, chart_id):
+    from myPages.page6 import build_chart, _load_p6
+
+    def heatmap():
+        ax = build_chart(chart_id, *_load_p6())[1].axes[0]
+        return ([t.get_text() for t in ax.get_xticklabels()], [t.get_text() for t in ax.get_yticklabels()],
+                np.asarray(ax.images[0].get_array()))
+
+    monkeypatch.setattr(sqlstore, "ENGINE", "")
+    cols, rows, z = heatmap()
+    monkeypatch.setattr(sqlstore, "ENGINE", "sqlite")
+    assert sqlstore.enabled()
+    sql_cols, sql_rows, sql_z = heatmap()
+
+    assert cols == sorted(cols)
+    assert (cols, rows) == (sql_cols, sql_rows)
+    np.testing.assert_array_equal(z, sql_z)